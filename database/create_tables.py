@@ -1,6 +1,7 @@
 from database.db import engine
 from database.models import Base
-from sqlalchemy import inspect
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
 
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -33,6 +34,28 @@ def create_specific_table(table_name: str):
         print(f"Table '{table_name}' already exists")
     return True
 
-if __name__ == "__main__":
+def upgrade_db():
+    """
+    Bring existing tables up to date with the models: add columns and indexes
+    that were introduced after the table was first created. Never drops anything.
+    """
     init_db()
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column_ddl}"))
+                    print(f"Added column '{table.name}.{column.name}'")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+                    print(f"Created index '{index.name}'")
+
+if __name__ == "__main__":
+    upgrade_db()
     # create_specific_table("votes")
\ No newline at end of file
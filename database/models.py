@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float
-from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Float, Computed, Index
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSON, TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -27,12 +27,20 @@ class Chat(Base):
     title = Column(String)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    company_ids = Column(JSON, nullable=True)  # Retrieval scope: list of company ids, null searches every company
+    summary = Column(Text, nullable=True)  # Rolling summary of the turns no longer sent verbatim
+    summarized_until = Column(DateTime, nullable=True)  # created_at of the newest message folded into summary
     
     # Relationships
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat")
     votes = relationship("Vote", back_populates="chat")
 
+    __table_args__ = (
+        # Keyset pagination of a user's chats, newest first.
+        Index("ix_chats_user_created", "user_id", "created_at", "id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     
@@ -49,6 +57,11 @@ class Message(Base):
     user = relationship("User", back_populates="messages")
     votes = relationship("Vote", back_populates="message")
 
+    __table_args__ = (
+        # A chat's messages in order: history windows, pages and last-message previews.
+        Index("ix_messages_chat_created", "chat_id", "created_at", "id"),
+    )
+
 
 class Vote(Base):
     __tablename__ = "votes"
@@ -69,6 +82,9 @@ class Company(Base):
     ticker = Column(String, unique=True, index=True)
     name = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever new chunks for this company reach the vector store; cached answers
+    # computed against an older version are stale.
+    corpus_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     documents = relationship("Document", back_populates="company")
@@ -84,23 +100,70 @@ class Document(Base):
     page_number = Column(Integer, nullable=True)
     file_path = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Page size in PDF points, the coordinate space of Chunk.highlight_boxes.
+    page_width = Column(Float, nullable=True)
+    page_height = Column(Float, nullable=True)
+    # Digest of the page's text, layout and chunking settings; re-ingestion skips the page while it matches.
+    content_hash = Column(String(64), nullable=True)
     
     # Relationships
     company = relationship("Company", back_populates="documents")
     chunks = relationship("Chunk", back_populates="document")
 
+    __table_args__ = (
+        Index("ix_documents_file_path_page", "file_path", "page_number"),
+    )
+
 
 class Chunk(Base):
     __tablename__ = "chunks"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
-    company_id = Column(UUID(as_uuid=True), ForeignKey("company.id", ondelete="CASCADE"), nullable=False)
+    company_id = Column(UUID(as_uuid=True), ForeignKey("company.id", ondelete="CASCADE"), nullable=False, index=True)
     text = Column(Text)
     context = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Where the chunk lies in its document's page text, and the rectangles covering it
+    # on the page ([x0, y0, x1, y1] in PDF points, origin bottom-left), found at ingestion.
+    char_start = Column(Integer, nullable=True)
+    char_end = Column(Integer, nullable=True)
+    highlight_boxes = Column(JSON, nullable=True)
+    # Digest of the content and metadata last written to the vector store for this chunk;
+    # the export skips chunks whose digest still matches.
+    vector_hash = Column(String(64), nullable=True)
+    # Full-text index over the chunk and its generated context. Postgres recomputes it
+    # whenever ingestion inserts a chunk or the contextualiser updates its context.
+    search_vector = Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(text, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(context, '')), 'B')",
+            persisted=True
+        )
+    )
     
     # Relationships
     document = relationship("Document", back_populates="chunks")
     company = relationship("Company", back_populates="chunks")
 
+    __table_args__ = (
+        Index("ix_chunks_search_vector", search_vector, postgresql_using="gin"),
+    )
+    # Don't read the generated tsvector back after every insert.
+    __mapper_args__ = {"eager_defaults": False}
+
+
+class IngestedFile(Base):
+    """Ingestion manifest: the last stored version of each source file."""
+    __tablename__ = "ingested_files"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_path = Column(String, unique=True, nullable=False)
+    company_id = Column(UUID(as_uuid=True), ForeignKey("company.id", ondelete="CASCADE"), nullable=False)
+    # sha256 of the file's bytes, and the settings its chunks were made with.
+    file_hash = Column(String(64), nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    chunk_overlap = Column(Integer, nullable=False)
+    page_count = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime, default=datetime.utcnow)
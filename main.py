@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -5,14 +6,32 @@ import os
 from routes.auth import router as auth_router
 from routes.chat import router as chat_router
 from routes.company import router as company_router
+from routes.health import router as health_router
+from services.retrieval import get_retrieval_clients, close_retrieval_clients
+from database.db import READ_PRIMARY_UNTIL_HEADER, dispose_engines, read_your_writes_middleware
+from services.auth import password_hasher
+from services.citation_pages import citation_page_cache
+from services.history import history_manager
 import uvicorn
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the retrieval clients once and open their pools before serving traffic.
+    await get_retrieval_clients().warmup()
+    await history_manager.warmup()
+    yield
+    await close_retrieval_clients()
+    await dispose_engines()
+    password_hasher.close()
+    citation_page_cache.close()
+
 app = FastAPI(
     title="VeritaForge Research",
     description="Backend API for VeritaForge Research",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -22,12 +41,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursors and read-your-writes hints are sent as response headers.
+    expose_headers=["X-Next-Cursor", "ETag", READ_PRIMARY_UNTIL_HEADER],
 )
+# Keeps a client's reads on the primary right after it writes, across workers.
+app.middleware("http")(read_your_writes_middleware)
 
 # Register routers
 app.include_router(auth_router, tags=["Authentication"])
 app.include_router(chat_router, tags=["Chat"])
 app.include_router(company_router, tags=["Companies"])
+app.include_router(health_router, tags=["Health"])
 # Root endpoint
 @app.get("/")
 async def root():
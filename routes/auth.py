@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Annotated
 from datetime import timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User
 from database.db import get_db
-from services.auth import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash
+from services.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, password_hasher, token_claims
 from pydantic import BaseModel, EmailStr
 
 router = APIRouter()
@@ -29,9 +30,9 @@ class UserResponse(BaseModel):
     password: str
 
 @router.post("/auth/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     # Find user by email
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
     
     if not user:
         raise HTTPException(
@@ -40,18 +41,23 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Verify password
-    if not verify_password(user_data.password, user.hashed_password):
+    # Verify password (bcrypt runs on the hashing pool, off the event loop)
+    verified, new_hash = await password_hasher.verify_and_update(user_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash is not None:
+        # BCRYPT_ROUNDS changed since this hash was made; store one at the current cost.
+        user.hashed_password = new_hash
+        await db.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
     return {"token": access_token, "token_type": "bearer"}
@@ -59,9 +65,9 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 ## damn this code is also so novel in its nature.
 # try to make this up locally & check the interactions.
 @router.post("/auth/register", response_model=Token)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = (await db.execute(select(User).where(User.email == user_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -69,7 +75,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
     
     # Check if username already exists
-    username_exists = db.query(User).filter(User.username == user_data.username).first()
+    username_exists = (await db.execute(select(User).where(User.username == user_data.username))).scalars().first()
     if username_exists:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -77,7 +83,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     new_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -85,31 +91,31 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    # my access token only takes new_user's email into the dict context.
+    # the token carries the user's id, so authenticated requests don't need to look it up.
     access_token = create_access_token(
-        data={"sub": new_user.email}, expires_delta=access_token_expires
+        data=token_claims(new_user), expires_delta=access_token_expires
     )
     
     return {"token": access_token, "token_type": "bearer"}
 
 @router.get("/auth/user", response_model=UserResponse)
-async def get_user(email: str = None, username: str = None, db: Session = Depends(get_db)):
+async def get_user(email: str = None, username: str = None, db: AsyncSession = Depends(get_db)):
     if not email and not username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Either email or username must be provided",
         )
     
-    query = db.query(User)
+    query = select(User)
     if email:
-        user = query.filter(User.email == email).first()
+        query = query.where(User.email == email)
     else:
-        user = query.filter(User.username == username).first()
+        query = query.where(User.username == username)
+    user = (await db.execute(query)).scalars().first()
     
     if not user:
         raise HTTPException(
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union, Literal
 from pydantic import BaseModel
 from datetime import datetime
 from services.chat import ChatService
-from services.auth import get_current_user
-from sqlalchemy.orm import Session
-from database.models import Chat, Message, User, Vote
-from database.db import get_db
+from services.history import history_manager
+from services.auth import AuthenticatedUser, get_current_user
+from services.citation_pages import PageNotFound, citation_page_cache
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from database.models import Chat, Chunk, Document, Message, Vote
+from database.db import get_db, get_read_db, AsyncSessionLocal
 from uuid import UUID
-import PyPDF2
-from io import BytesIO
+import hashlib
+import asyncio
+import json
 
 router = APIRouter()
 chat_service = ChatService()
 
+# Characters of the latest message shown in the chat list.
+CHAT_PREVIEW_LENGTH = 160
+
 class Citation(BaseModel):
     file_path: Optional[str]
     page_number: Optional[float]
@@ -34,6 +45,11 @@ class MessageCreate(BaseModel):
 class ChatCreate(BaseModel):
     message: MessageCreate
     id: UUID
+    # Companies whose filings answers are retrieved from; omitted or empty searches every company.
+    company_ids: Optional[List[UUID]] = None
+    # Return as soon as the answer is ready with a provisional title; the generated
+    # title is stored in the background and shows up on the next GET /chats/{id}.
+    defer_title: bool = False
 
 class MessageResponse(BaseModel):
     id: UUID
@@ -47,6 +63,16 @@ class ChatResponse(BaseModel):
     title: str
     created_at: datetime
     messages: List[MessageResponse]
+    company_ids: Optional[List[UUID]] = None
+
+class ChatSummaryResponse(BaseModel):
+    id: UUID
+    title: str
+    created_at: datetime
+    company_ids: Optional[List[UUID]] = None
+    message_count: int
+    last_message_preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
 
 class VoteResponse(BaseModel):
     id: str
@@ -55,6 +81,18 @@ class VoteResponse(BaseModel):
     type: str
     created_at: datetime
 
+class CitationHighlightResponse(BaseModel):
+    chunk_id: UUID
+    document_id: UUID
+    file_path: Optional[str]
+    page_number: Optional[int]
+    page_width: Optional[float]
+    page_height: Optional[float]
+    char_start: Optional[int]
+    char_end: Optional[int]
+    # [x0, y0, x1, y1] in PDF points, origin at the bottom-left of the page
+    boxes: List[List[float]]
+
 class VoteUpdateRequest(BaseModel):
     type: str
 
@@ -66,26 +104,39 @@ class VoteUpdateRequest(BaseModel):
 @router.post("/chats", response_model=ChatResponse)
 async def create_chat(
     chat: ChatCreate,
-    current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     chat_id = chat.id
     message_id = chat.message.id
     chat_created_at = None
     chat_title = None
 
-    existing_chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == current_user.id).first()
+    existing_chat = (await db.execute(
+        select(Chat).where(Chat.id == chat_id, Chat.user_id == current_user.id)
+    )).scalars().first()
 
     if existing_chat:
         chat_created_at = existing_chat.created_at
         chat_title = existing_chat.title
+        company_ids = existing_chat.company_ids
     else:
-        chat_title = await chat_service.create_chat_title(chat.message.content)
+        # The retrieval scope is fixed when the chat is created and reused for every turn.
+        company_ids = [str(company_id) for company_id in chat.company_ids] if chat.company_ids else None
+        # Stored with a provisional title so the messages can reference it while
+        # the real title is generated alongside the answer.
         # is the chatDTO required outside this scope ?
-        chatDTO = Chat(id=chat.id, title=chat_title, user_id=current_user.id)
+        chatDTO = Chat(
+            id=chat.id,
+            title=chat_service.placeholder_title(chat.message.content),
+            user_id=current_user.id,
+            company_ids=company_ids
+        )
         db.add(chatDTO)
-        db.commit()
+        await db.commit()
         chat_created_at = chatDTO.created_at
+        chat_title = chatDTO.title
 
     
     # Add initial message
@@ -99,9 +150,31 @@ async def create_chat(
         user_id=current_user.id
     )
     db.add(user_message)
+    # commit before generating so no connection is held across the LLM call.
+    await db.commit()
     
     # Generate AI response -> over here the AI needs to respond.
-    ai_response = await chat_service.generate_response([{"role": "user", "content": chat.message.content}])
+    answer = chat_service.generate_response(
+        [{"role": "user", "content": chat.message.content}],
+        company_ids=company_ids
+    )
+    if existing_chat:
+        ai_response = await answer
+    elif chat.defer_title:
+        ai_response = await answer
+        background_tasks.add_task(_store_generated_title, chat_id, chat.message.content)
+    else:
+        # Title and answer are independent, so the two LLM calls run side by side.
+        title, ai_response = await asyncio.gather(
+            chat_service.create_chat_title(chat.message.content), answer, return_exceptions=True
+        )
+        if isinstance(ai_response, BaseException):
+            raise ai_response
+        if isinstance(title, BaseException):
+            print(f"Title generation failed for chat {chat_id}: {title}")
+        else:
+            chatDTO.title = title
+            chat_title = title
 
     # yeah see here it was able to create the message UUID by itself.
 
@@ -113,7 +186,7 @@ async def create_chat(
         metadata_fields=ai_response["metadata"]
     )
     db.add(ai_message)
-    db.commit()
+    await db.commit()
 
     # due to my bad implementation above. this is suffering.
     # You know the fuck up. -> Fixed it by extracting the return object fields.
@@ -125,6 +198,7 @@ async def create_chat(
         id=chat_id,
         title=chat_title,
         created_at=chat_created_at,
+        company_ids=company_ids,
         messages=[
             MessageResponse(
                 id=user_message.id,
@@ -143,15 +217,33 @@ async def create_chat(
         ]
     )
 
-@router.post("/chats/{chat_id}/messages", response_model=MessageResponse)
-async def create_message(
+async def _store_generated_title(chat_id: UUID, first_message: str):
+    """Background task replacing a chat's provisional title with a generated one."""
+    try:
+        title = await chat_service.create_chat_title(first_message)
+    except Exception as e:
+        print(f"Title generation failed for chat {chat_id}: {e}")
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Chat).where(Chat.id == chat_id).values(title=title))
+        await db.commit()
+
+async def _add_user_message(
     chat_id: UUID,
     message: MessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+    current_user: AuthenticatedUser,
+    db: AsyncSession,
+    background_tasks: BackgroundTasks
+) -> Tuple[List[Dict[str, str]], Optional[List[str]]]:
+    """
+    Check chat access, persist the user's message and return the history for the LLM
+    together with the chat's retrieval scope.
+
+    The history is the chat summary plus the newest messages that fit HISTORY_TOKEN_BUDGET;
+    when older messages fall outside it, a summary refresh is scheduled after the response.
+    """
     # Get chat history
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -166,17 +258,31 @@ async def create_message(
         user_id=current_user.id
     )
     db.add(user_message)
-    db.commit()
+    await db.commit()
     
     # Get chat history for context -> It gets the message history from the backend.
     # good design pattern - it only returns the response.
     # the ui will have all the details.
     # in case some error, on reload all elements will appear again.
-    chat_history = db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.created_at).all()
-    messages_for_ai = [{"role": msg.role, "content": msg.content} for msg in chat_history]
+    # Only messages newer than the summary are loaded, so this stays bounded too.
+    chat_history = await history_manager.load_unsummarized(db, chat)
+    messages_for_ai, needs_summary = history_manager.build_prompt_history(chat, chat_history)
+    if needs_summary:
+        background_tasks.add_task(history_manager.refresh_summary, chat_id)
+    return messages_for_ai, chat.company_ids
+
+@router.post("/chats/{chat_id}/messages", response_model=MessageResponse)
+async def create_message(
+    chat_id: UUID,
+    message: MessageCreate,
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    messages_for_ai, company_ids = await _add_user_message(chat_id, message, current_user, db, background_tasks)
     
     # Generate AI response
-    ai_response = await chat_service.generate_response(messages_for_ai)
+    ai_response = await chat_service.generate_response(messages_for_ai, company_ids=company_ids)
     ai_message = Message(
         content=ai_response["content"],
         role="assistant",
@@ -185,7 +291,7 @@ async def create_message(
         metadata_fields=ai_response["metadata"]
     )
     db.add(ai_message)
-    db.commit()
+    await db.commit()
     
     return MessageResponse(
         id=ai_message.id,
@@ -195,43 +301,341 @@ async def create_message(
         metadata_fields=ai_message.metadata_fields
     )
 
-@router.get("/chats", response_model=List[ChatResponse])
+@router.post("/chats/{chat_id}/messages/stream")
+async def stream_message(
+    chat_id: UUID,
+    message: MessageCreate,
+    background_tasks: BackgroundTasks,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Streaming variant of create_message, sent as newline-delimited JSON:
+    one "metadata" event with the citations, "token" events as text is generated,
+    then a "done" event carrying the stored assistant MessageResponse.
+    The assistant message is written when the stream completes, or with the
+    partial text if the client disconnects mid-stream. A summary refresh, if
+    due, runs after the stream ends.
+    """
+    messages_for_ai, company_ids = await _add_user_message(chat_id, message, current_user, db, background_tasks)
+    reply = _StreamedReply(chat_id, current_user.id, messages_for_ai, company_ids)
+    return _StreamedReplyResponse(
+        reply,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Replies still generating or being stored; the event loop only keeps weak references to tasks.
+_reply_tasks = set()
+
+class _StreamedReply:
+    """
+    Generates one streamed answer in a task of its own and stores it with its own
+    session, so the message is saved whatever happens to the response. A client
+    disconnect leaves the response's generator suspended at a yield until it is
+    garbage collected, so nothing that must happen promptly can live there.
+    """
+
+    def __init__(self, chat_id: UUID, user_id: UUID, messages_for_ai: List[Dict[str, str]],
+                 company_ids: Optional[List[str]]):
+        self._lines: asyncio.Queue = asyncio.Queue()
+        self._generating = True
+        self.task = asyncio.create_task(self._generate(chat_id, user_id, messages_for_ai, company_ids))
+        _reply_tasks.add(self.task)
+        self.task.add_done_callback(_reply_tasks.discard)
+
+    async def _generate(self, chat_id: UUID, user_id: UUID, messages_for_ai: List[Dict[str, str]],
+                        company_ids: Optional[List[str]]):
+        tokens = []
+        metadata = []
+        completed = False
+        try:
+            async for event in chat_service.stream_response(messages_for_ai, company_ids=company_ids):
+                if event["type"] == "metadata":
+                    metadata = event["metadata"]
+                    payload = {"type": "metadata", "metadata_fields": metadata}
+                else:
+                    tokens.append(event["content"])
+                    payload = event
+                self._lines.put_nowait(json.dumps(payload) + "\n")
+            completed = True
+        except Exception as e:
+            self._lines.put_nowait(e)
+        finally:
+            # Runs on completion, on failure and when stop() cancels generation after a
+            # disconnect. Nothing is stored if generation failed before producing any text.
+            self._generating = False
+            try:
+                if completed or tokens:
+                    ai_message = await _persist_assistant_message(chat_id, user_id, "".join(tokens), metadata)
+                    if completed:
+                        self._lines.put_nowait(json.dumps({
+                            "type": "done",
+                            "message": jsonable_encoder(MessageResponse(
+                                id=ai_message.id,
+                                content=ai_message.content,
+                                role=ai_message.role,
+                                created_at=ai_message.created_at,
+                                metadata_fields=ai_message.metadata_fields
+                            ))
+                        }) + "\n")
+            except Exception as e:
+                # After a disconnect nobody reads the stream, so report it here too.
+                print(f"Failed to store the reply to chat {chat_id}: {e}")
+                self._lines.put_nowait(e)
+            finally:
+                # Always end the stream, or the response would wait forever.
+                self._lines.put_nowait(None)
+
+    async def lines(self) -> AsyncIterator[str]:
+        while True:
+            line = await self._lines.get()
+            if line is None:
+                return
+            if isinstance(line, BaseException):
+                raise line
+            yield line
+
+    def stop(self):
+        """Stop generating once nobody is reading; the text so far is still stored."""
+        # Once generation has ended the task is only storing the reply; let it finish.
+        if self._generating:
+            self.task.cancel()
+
+class _StreamedReplyResponse(StreamingResponse):
+    """Streams a _StreamedReply and stops it as soon as sending ends, normally or not."""
+
+    def __init__(self, reply: _StreamedReply, **kwargs):
+        super().__init__(reply.lines(), **kwargs)
+        self.reply = reply
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.reply.stop()
+
+async def _persist_assistant_message(chat_id: UUID, user_id: UUID, content: str, metadata: List[Dict[str, Any]]) -> Message:
+    async with AsyncSessionLocal() as db:
+        ai_message = Message(
+            content=content,
+            role="assistant",
+            chat_id=chat_id,
+            user_id=user_id,
+            metadata_fields=metadata
+        )
+        db.add(ai_message)
+        await db.commit()
+        return ai_message
+
+@router.get("/chats", response_model=Union[List[ChatSummaryResponse], List[ChatResponse]])
 async def get_chats(
-    current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    view: Literal["summary", "full"] = Query("summary", description="summary for the chat list, full to include messages"),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    chats = db.query(Chat).filter(Chat.user_id == current_user.id).all()
+    """
+    List the user's chats, newest first, one page at a time. The cursor for the
+    next page is returned in the X-Next-Cursor header. Each page costs a fixed
+    number of queries whatever the number of chats or messages.
+    """
+    query = select(Chat).where(Chat.user_id == current_user.id)
+    if cursor:
+        query = query.where(tuple_(Chat.created_at, Chat.id) < tuple_(*_decode_cursor_param(cursor)))
+    query = query.order_by(Chat.created_at.desc(), Chat.id.desc()).limit(limit + 1)
+    if view == "full":
+        query = query.options(selectinload(Chat.messages))
+
+    chats = (await db.execute(query)).scalars().all()
+    if len(chats) > limit:
+        chats = chats[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(chats[-1].created_at, chats[-1].id)
+
+    if view == "full":
+        return [
+            ChatResponse(
+                id=chat.id,
+                title=chat.title,
+                created_at=chat.created_at,
+                company_ids=chat.company_ids,
+                messages=[
+                    MessageResponse(
+                        id=msg.id,
+                        content=msg.content,
+                        role=msg.role,
+                        created_at=msg.created_at,
+                        metadata_fields=msg.metadata_fields
+                    ) for msg in sorted(chat.messages, key=lambda msg: (msg.created_at, str(msg.id)))
+                ]
+            ) for chat in chats
+        ]
+
+    chat_ids = [chat.id for chat in chats]
+    counts = {}
+    latest = {}
+    if chat_ids:
+        counts = dict((await db.execute(
+            select(Message.chat_id, func.count(Message.id))
+            .where(Message.chat_id.in_(chat_ids))
+            .group_by(Message.chat_id)
+        )).all())
+        # DISTINCT ON keeps the newest message of each chat.
+        latest = {
+            chat_id: (preview, created_at)
+            for chat_id, preview, created_at in (await db.execute(
+                select(Message.chat_id, func.left(Message.content, CHAT_PREVIEW_LENGTH), Message.created_at)
+                .where(Message.chat_id.in_(chat_ids))
+                .distinct(Message.chat_id)
+                .order_by(Message.chat_id, Message.created_at.desc(), Message.id.desc())
+            )).all()
+        }
+
     return [
-        ChatResponse(
+        ChatSummaryResponse(
             id=chat.id,
             title=chat.title,
             created_at=chat.created_at,
-            messages=[
-                MessageResponse(
-                    id=msg.id,
-                    content=msg.content,
-                    role=msg.role,
-                    created_at=msg.created_at,
-                    metadata_fields=msg.metadata_fields
-                ) for msg in chat.messages
-            ]
+            company_ids=chat.company_ids,
+            message_count=counts.get(chat.id, 0),
+            last_message_preview=latest.get(chat.id, (None, None))[0],
+            last_message_at=latest.get(chat.id, (None, None))[1]
         ) for chat in chats
     ]
 
+# Registered before /chats/{chat_id} so "citations" is not taken for a chat id.
+@router.post("/chats/citations")
+async def fetch_highlighted_pdf(
+    citation: Citation,
+    request: Request,
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """Return the cited page as a single-page PDF."""
+    return await _citation_page_response(citation.file_path, int(citation.page_number), request)
+
+@router.get("/chats/citations")
+async def get_citation_page(
+    request: Request,
+    file_path: str = Query(...),
+    page_number: int = Query(..., ge=1),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """GET form of /chats/citations, so browsers can reuse the page via ETag and Cache-Control."""
+    return await _citation_page_response(file_path, page_number, request)
+
+@router.get("/chats/citations/{chunk_id}/highlights", response_model=CitationHighlightResponse)
+async def get_citation_highlights(
+    chunk_id: UUID,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Where a cited chunk sits on its page, for drawing highlights over the page from
+    /chats/citations. Computed at ingestion, so this is a single indexed lookup.
+    """
+    row = (await db.execute(
+        select(
+            Chunk.id, Chunk.document_id, Chunk.char_start, Chunk.char_end, Chunk.highlight_boxes,
+            Document.file_path, Document.page_number, Document.page_width, Document.page_height
+        )
+        .join(Document, Chunk.document_id == Document.id)
+        .where(Chunk.id == chunk_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+
+    return CitationHighlightResponse(
+        chunk_id=row.id,
+        document_id=row.document_id,
+        file_path=row.file_path,
+        page_number=row.page_number,
+        page_width=row.page_width,
+        page_height=row.page_height,
+        char_start=row.char_start,
+        char_end=row.char_end,
+        boxes=row.highlight_boxes or []
+    )
+
+class _CitationPageResponse(FileResponse):
+    """A page file pinned in the citation cache, unpinned however sending it ends."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            citation_page_cache.release(self.path)
+
+async def _citation_page_response(pdf_path: str, page_number: int, request: Request) -> Response:
+    # Page numbers are 1-based
+    try:
+        key = citation_page_cache.key(pdf_path, page_number)
+        headers = {
+            "ETag": f'"{key}"',
+            # The key changes whenever the source file does, so the page can be cached for a while.
+            "Cache-Control": "private, max-age=86400",
+        }
+        if f'"{key}"' in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        page_path = await citation_page_cache.get_page(pdf_path, page_number, key)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail="PDF file not found"
+        )
+    except PageNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing PDF: {str(e)}"
+        )
+
+    # Served straight from the cache file (zero-copy sendfile where the server supports it).
+    return _CitationPageResponse(
+        page_path,
+        media_type="application/pdf",
+        headers={
+            **headers,
+            "Content-Disposition": f'attachment; filename="page_{page_number}.pdf"'
+        }
+    )
+
 @router.get("/chats/{chat_id}", response_model=ChatResponse)
 async def get_chat(
     chat_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page, to load older messages"),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == current_user.id).first()
+    """
+    Return a chat with its newest page of messages, in chronological order.
+    Older pages are fetched by passing the X-Next-Cursor header back as before.
+    """
+    chat = (await db.execute(
+        select(Chat).where(Chat.id == chat_id, Chat.user_id == current_user.id)
+    )).scalars().first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
+
+    query = select(Message).where(Message.chat_id == chat_id)
+    if before:
+        query = query.where(tuple_(Message.created_at, Message.id) < tuple_(*_decode_cursor_param(before)))
+    messages = (await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    )).scalars().all()
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1].created_at, messages[-1].id)
     
     return ChatResponse(
         id=chat.id,
         title=chat.title,
         created_at=chat.created_at,
+        company_ids=chat.company_ids,
         messages=[
             MessageResponse(
                 id=msg.id,
@@ -239,18 +643,80 @@ async def get_chat(
                 role=msg.role,
                 created_at=msg.created_at,
                 metadata_fields=msg.metadata_fields
-            ) for msg in chat.messages
+            ) for msg in reversed(messages)
         ]
     )
 
+@router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
+async def sync_messages(
+    chat_id: UUID,
+    request: Request,
+    response: Response,
+    after: Optional[str] = Query(None, description="Cursor of the newest message the client already has"),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Incremental sync: messages newer than the after cursor, oldest first. X-Next-Cursor
+    is the after value for the next poll. The ETag changes only when a message is
+    added, so a poll with a matching If-None-Match gets an empty 304.
+    """
+    chat = (await db.execute(
+        select(Chat.id).where(Chat.id == chat_id, Chat.user_id == current_user.id)
+    )).first()
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    # Newest message position, read from the (chat_id, created_at, id) index.
+    newest = (await db.execute(
+        select(Message.created_at, Message.id)
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+    )).first()
+    newest_cursor = encode_cursor(*newest) if newest else ""
+    etag = '"' + hashlib.sha256(f"{after or ''}|{newest_cursor}|{limit}".encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    query = select(Message).where(Message.chat_id == chat_id)
+    if after:
+        query = query.where(tuple_(Message.created_at, Message.id) > tuple_(*_decode_cursor_param(after)))
+    messages = (await db.execute(
+        query.order_by(Message.created_at, Message.id).limit(limit)
+    )).scalars().all()
+
+    response.headers.update(headers)
+    if messages:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1].created_at, messages[-1].id)
+    elif after:
+        response.headers[NEXT_CURSOR_HEADER] = after
+    return [
+        MessageResponse(
+            id=msg.id,
+            content=msg.content,
+            role=msg.role,
+            created_at=msg.created_at,
+            metadata_fields=msg.metadata_fields
+        ) for msg in messages
+    ]
+
+def _decode_cursor_param(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/chats/{chat_id}/votes", response_model=List[VoteResponse])
 async def get_votes_by_chat_id(
     chat_id: UUID,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Check if chat exists and user has access
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -258,7 +724,7 @@ async def get_votes_by_chat_id(
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
     
     # Get all votes for the chat
-    votes = db.query(Vote).filter(Vote.chat_id == str(chat_id)).all()
+    votes = (await db.execute(select(Vote).where(Vote.chat_id == str(chat_id)))).scalars().all()
     
     return [
         VoteResponse(
@@ -275,11 +741,11 @@ async def update_vote(
     chat_id: UUID,
     message_id: UUID,
     vote_update: VoteUpdateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if chat exists and user has access
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -287,18 +753,18 @@ async def update_vote(
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
     
     # Check if message exists in the chat
-    message = db.query(Message).filter(
+    message = (await db.execute(select(Message).where(
         Message.id == message_id,
         Message.chat_id == chat_id
-    ).first()
+    ))).scalars().first()
     if not message:
         raise HTTPException(status_code=404, detail="Message not found in this chat")
     
     # Find existing vote or create new one
-    vote = db.query(Vote).filter(
+    vote = (await db.execute(select(Vote).where(
         Vote.chat_id == str(chat_id),
         Vote.message_id == str(message_id)
-    ).first()
+    ))).scalars().first()
     
     if vote:
         # Update existing vote
@@ -312,8 +778,7 @@ async def update_vote(
         )
         db.add(vote)
     
-    db.commit()
-    db.refresh(vote)
+    await db.commit()
 
     # what's happening here ?
     return VoteResponse(
@@ -323,57 +788,3 @@ async def update_vote(
         type=vote.type,
         created_at=vote.created_at
     )
-
-@router.post("/chats/citations")
-async def fetch_highlighted_pdf(
-    citation: Citation,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    print(f"Fetching highlighted pdf.")
-
-    # Path to the PDF file
-    pdf_path = citation.file_path
-
-    # Get the page number from query parameters (default to 1 if not provided)
-    page_number = int(citation.page_number)  # Page numbers are 1-based
-
-    try:
-        # Open the PDF file
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-
-            # Check if the requested page exists
-            if page_number < 1 or page_number > len(pdf_reader.pages):
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"Page {page_number} does not exist in the PDF."
-                )
-
-            # Extract the requested page
-            pdf_writer = PyPDF2.PdfWriter()
-            pdf_writer.add_page(pdf_reader.pages[page_number - 1])  # Convert to 0-based index
-
-            # Write the extracted page to a BytesIO object
-            output_pdf = BytesIO()
-            pdf_writer.write(output_pdf)
-            output_pdf.seek(0)
-
-            # Return the PDF as a response with appropriate headers
-            return Response(
-                content=output_pdf.getvalue(),
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f'attachment; filename="page_{page_number}.pdf"'
-                }
-            )
-    except FileNotFoundError:
-        raise HTTPException(
-            status_code=404,
-            detail="PDF file not found"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing PDF: {str(e)}"
-        )
\ No newline at end of file
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, Query, Depends
+from typing import List
 from pydantic import BaseModel
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database.db import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import get_read_db
 from database.models import Company
+from services.company_index import company_index
 from uuid import UUID
 
 router = APIRouter(prefix="/companies", tags=["companies"])
@@ -20,31 +22,55 @@ class CompanyResponse(BaseModel):
         orm_mode = True
 
 
+class CompanyMatchResponse(BaseModel):
+    id: UUID
+    ticker: str
+    name: str
+    score: float
+
+
 @router.get("", response_model=List[CompanyResponse])
 async def list_companies(
     query: str = Query(None, description="Search term for filtering companies"),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of matches when searching"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    List all companies or search companies using a query parameter
+    List all companies, or search them when a query is given.
+
+    A search returns at most `limit` (default 50) companies ranked by relevance from the
+    in-memory company index: ticker and name prefixes first, then infix and approximate
+    matches. It no longer returns every row whose name or ticker contains the query.
     """
-    # Base query
-    companies_query = db.query(Company)
-    
-    # Apply search filter if query is provided
     if query:
-        # Search in name and ticker
-        companies_query = companies_query.filter(
-            (Company.name.ilike(f"%{query}%")) | 
-            (Company.ticker.ilike(f"%{query}%"))
-        )
-    
-    # Get all companies
-    companies = companies_query.all()
+        # Served from the in-memory index rather than an unindexable ilike '%...%' scan.
+        await company_index.refresh_if_due()
+        return [
+            CompanyResponse(id=entry.id, ticker=entry.ticker, name=entry.name, created_at=entry.created_at)
+            for entry, _ in company_index.search(query, limit=limit)
+        ]
+
+    companies = (await db.execute(select(Company))).scalars().all()
     
     return companies
 
 
+@router.get("/autocomplete", response_model=List[CompanyMatchResponse])
+async def autocomplete_companies(
+    q: str = Query(..., min_length=1, description="Partial company name or ticker"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Ranked company suggestions for search-as-you-type: exact and prefix ticker
+    matches first, then name prefixes, then infix and approximate matches.
+    """
+    await company_index.refresh_if_due()
+    return [
+        CompanyMatchResponse(id=entry.id, ticker=entry.ticker, name=entry.name, score=round(score, 2))
+        for entry, score in company_index.search(q, limit=limit)
+    ]
+
+
 @router.get("/{company_id}/financials")
 async def get_company_financials(company_id: str):
     """
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Response, status
+from database.db import pool_stats
+from services.answer_cache import get_answer_cache
+from services.auth import AuthenticatedUser, get_current_user, password_hasher, user_cache
+from services.citation_pages import citation_page_cache
+from services.company_index import company_index
+from services.retrieval import get_retrieval_clients
+
+router = APIRouter(prefix="/health")
+
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """
+    Readiness probe. Reports ready once the retrieval clients have been warmed up;
+    a failed startup warmup is retried here so the instance can recover on its own.
+    """
+    clients = get_retrieval_clients()
+    if not clients.ready:
+        await clients.warmup()
+    if not clients.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": clients.ready, "error": clients.warmup_error}
+
+
+@router.get("/stats")
+async def stats(current_user: AuthenticatedUser = Depends(get_current_user)):
+    """Connection pool, call and cache statistics for tuning. Requires a signed-in user."""
+    answer_cache = get_answer_cache()
+    return {
+        "db_pool": pool_stats(),
+        "retrieval": get_retrieval_clients().stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "citation_pages": citation_page_cache.stats(),
+        "company_index": company_index.stats(),
+    }
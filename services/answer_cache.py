@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.db import AsyncSessionLocal
+from database.models import Company
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Minimum cosine similarity between two questions for one to reuse the other's answer.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "21600"))
+# How often Company.corpus_version is polled to pick up ingestion done by other processes.
+ANSWER_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("ANSWER_CACHE_VERSION_CHECK_SECONDS", "30"))
+
+# Scope of a question asked across the whole corpus.
+GLOBAL_SCOPE: Tuple[str, ...] = ()
+
+
+class CachedAnswer:
+    def __init__(self, question: str, content: str, metadata: List[Dict[str, Any]],
+                 scope: Tuple[str, ...], generation_seconds: float):
+        self.question = question
+        self.content = content
+        self.metadata = metadata
+        self.scope = scope
+        # Companies whose chunks back this answer, on top of the requested scope.
+        self.company_ids = {str(m["company_id"]) for m in metadata if m.get("company_id")}
+        self.generation_seconds = generation_seconds
+        self.created_at = time.monotonic()
+
+
+class _ScopeIndex:
+    """Question embeddings of one scope in a growable matrix, for one matmul per lookup."""
+
+    def __init__(self, dimension: int):
+        self.matrix = np.zeros((16, dimension), dtype=np.float32)
+        self.entry_ids: List[int] = []
+        self.row_of: Dict[int, int] = {}
+
+    def add(self, entry_id: int, vector: np.ndarray):
+        if len(self.entry_ids) == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        row = len(self.entry_ids)
+        self.matrix[row] = vector
+        self.entry_ids.append(entry_id)
+        self.row_of[entry_id] = row
+
+    def remove(self, entry_id: int):
+        # Move the last row into the freed slot.
+        row = self.row_of.pop(entry_id)
+        last = len(self.entry_ids) - 1
+        if row != last:
+            moved = self.entry_ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.entry_ids[row] = moved
+            self.row_of[moved] = row
+        self.entry_ids.pop()
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        count = len(self.entry_ids)
+        if count == 0:
+            return None, 0.0
+        similarities = self.matrix[:count] @ vector
+        row = int(np.argmax(similarities))
+        return self.entry_ids[row], float(similarities[row])
+
+
+class SemanticAnswerCache:
+    """
+    Reuses a previous answer when a new standalone question embeds within the
+    similarity threshold of a cached one asked in the same retrieval scope.
+
+    Bounded by entry count with LRU eviction and a TTL. Entries touching a company
+    are dropped when that company's corpus_version changes, i.e. when new chunks
+    for it are ingested; answers from unscoped questions are dropped on any change.
+    """
+
+    def __init__(self, similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 version_check_seconds: float = ANSWER_CACHE_VERSION_CHECK_SECONDS):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._scopes: Dict[Hashable, _ScopeIndex] = {}
+        self._next_id = 0
+        self._versions: Optional[Dict[str, int]] = None
+        self._versions_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lookup_seconds = 0.0
+        self.hit_similarity_total = 0.0
+        self.miss_similarity_total = 0.0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, embedding: List[float], scope: Tuple[str, ...] = GLOBAL_SCOPE) -> Optional[CachedAnswer]:
+        await self._refresh_versions_if_due()
+        started_at = time.perf_counter()
+        vector = self._unit(embedding)
+        with self._lock:
+            answer, similarity = None, 0.0
+            # An expired nearest entry is dropped and the search repeated, so a live
+            # entry just behind it can still answer.
+            while answer is None:
+                index = self._scopes.get(scope)
+                if index is None:
+                    similarity = 0.0
+                    break
+                entry_id, similarity = index.nearest(vector)
+                if entry_id is None or similarity < self.similarity_threshold:
+                    break
+                candidate = self._entries[entry_id]
+                if time.monotonic() - candidate.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                answer = candidate
+                self._entries.move_to_end(entry_id)
+
+            if answer is None:
+                self.misses += 1
+                self.miss_similarity_total += similarity
+            else:
+                self.hits += 1
+                self.hit_similarity_total += similarity
+                self.saved_seconds += answer.generation_seconds
+            self.lookup_seconds += time.perf_counter() - started_at
+        return answer
+
+    def store(self, question: str, embedding: List[float], content: str, metadata: List[Dict[str, Any]],
+              scope: Tuple[str, ...] = GLOBAL_SCOPE, generation_seconds: float = 0.0):
+        if not content:
+            return
+        vector = self._unit(embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CachedAnswer(question, content, metadata, scope, generation_seconds)
+            index = self._scopes.get(scope)
+            if index is None:
+                index = self._scopes[scope] = _ScopeIndex(len(vector))
+            index.add(entry_id, vector)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        index = self._scopes[entry.scope]
+        index.remove(entry_id)
+        if not index.entry_ids:
+            del self._scopes[entry.scope]
+
+    def invalidate_company(self, company_id: str):
+        company_id = str(company_id)
+        with self._lock:
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry.scope == GLOBAL_SCOPE or company_id in entry.scope or company_id in entry.company_ids
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    async def _refresh_versions_if_due(self):
+        now = time.monotonic()
+        if now - self._versions_checked_at < self.version_check_seconds:
+            return
+        # Claim the refresh before awaiting so concurrent lookups don't all poll.
+        self._versions_checked_at = now
+        try:
+            versions = await _load_corpus_versions()
+        except Exception as e:
+            print(f"Answer cache could not read corpus versions: {e}")
+            return
+        if self._versions is not None:
+            for company_id, version in versions.items():
+                if self._versions.get(company_id) != version:
+                    self.invalidate_company(company_id)
+        self._versions = versions
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "avg_lookup_ms": round(1000 * self.lookup_seconds / lookups, 3) if lookups else None,
+            # Compare these against the threshold to tune it.
+            "avg_hit_similarity": round(self.hit_similarity_total / self.hits, 4) if self.hits else None,
+            "avg_miss_nearest_similarity": round(self.miss_similarity_total / self.misses, 4) if self.misses else None,
+            "generation_seconds_saved": round(self.saved_seconds, 2),
+        }
+
+
+async def _load_corpus_versions() -> Dict[str, int]:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(Company.id, Company.corpus_version))).all()
+    return {str(company_id): version for company_id, version in rows}
+
+
+def mark_companies_changed(db: Session, company_ids: Iterable[str]):
+    """
+    Record that chunks of these companies were written, deleted or re-exported, so every
+    API process drops cached answers that depend on them. Call it in the transaction
+    that changes the chunks; the caller commits.
+    """
+    company_ids = list({str(company_id) for company_id in company_ids})
+    if not company_ids:
+        return
+    db.execute(
+        update(Company)
+        .where(Company.id.in_(company_ids))
+        .values(corpus_version=Company.corpus_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Return the process-wide answer cache, or None when ANSWER_CACHE_ENABLED is off."""
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_ENABLED:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
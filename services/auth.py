@@ -1,5 +1,10 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,7 +13,9 @@ import os
 from dotenv import load_dotenv
 from database.db import get_db
 from database.models import User
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.cache import LRUTTLCache
 
 load_dotenv()
 
@@ -16,16 +23,141 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Users resolved from token ids are kept this long, so authenticated requests skip the users table.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor. Changing it rehashes each user's password on their next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing passwords. bcrypt releases the GIL, so each one uses a core.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashes allowed to wait for a worker before logins are turned away with a 503.
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+class AuthenticatedUser:
+    """The caller of a request, as resolved from their access token."""
+
+    __slots__ = ("id", "email", "username")
+
+    def __init__(self, id: UUID, email: str, username: Optional[str]):
+        self.id = id
+        self.email = email
+        self.username = username
+
+
+user_cache = LRUTTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(user_id: UUID):
+    """Drop a user from this process's cache; other processes catch up within USER_CACHE_TTL_SECONDS."""
+    user_cache.pop(str(user_id))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_cached_user(target.id)
+
+
+def token_claims(user: User) -> Dict[str, Any]:
+    """Claims identifying a user in their access token."""
+    return {"sub": user.email, "uid": str(user.id), "username": user.username}
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so hashing never blocks the event loop
+    and a burst of logins cannot take more than PASSWORD_HASH_WORKERS cores.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.max_queue_depth = 0
+        self.queue_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def _timed(self, fn, args, submitted_at: float):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.running += 1
+            self.queue_seconds += started_at - submitted_at
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.hash_seconds += time.perf_counter() - started_at
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-ins in progress, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.pending - self.running)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, fn, args, time.perf_counter())
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password. When the stored hash uses an outdated cost factor, also
+        return a fresh hash for the caller to store; otherwise the second value is None.
+        """
+        verified, new_hash = await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "rounds": BCRYPT_ROUNDS,
+            "running": self.running,
+            "queue_depth": self.pending - self.running,
+            "max_queue_depth": self.max_queue_depth,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_queue_ms": round(1000 * self.queue_seconds / self.completed, 3) if self.completed else None,
+            "avg_hash_ms": round(1000 * self.hash_seconds / self.completed, 3) if self.completed else None,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -38,7 +170,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,11 +182,22 @@ async def get_current_user(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-    except JWTError:
+        user_id = UUID(payload["uid"]) if payload.get("uid") else None
+    except (JWTError, ValueError):
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+
+    if user_id is not None:
+        cached = user_cache.get(str(user_id))
+        if cached is not None:
+            return cached
+        query = select(User.id, User.email, User.username).where(User.id == user_id)
+    else:
+        # Tokens issued before ids were added to the claims; these expire within ACCESS_TOKEN_EXPIRE_MINUTES.
+        query = select(User.id, User.email, User.username).where(User.email == email)
+
+    row = (await db.execute(query)).first()
+    if row is None:
         raise credentials_exception
-        
+    user = AuthenticatedUser(*row)
+    user_cache.set(str(user.id), user)
     return user 
\ No newline at end of file
@@ -1,12 +1,19 @@
-from langchain_community.chat_models import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from typing import List, Dict, Any
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, BaseMessage
+from typing import List, Dict, Any, Tuple, AsyncIterator, Optional
 import os
+import time
 from dotenv import load_dotenv
-from utils.ingestion.query_vector import query_vector_store
+from services.answer_cache import GLOBAL_SCOPE, CachedAnswer, get_answer_cache
+from services.retrieval import aretrieve, get_retrieval_clients
 
 load_dotenv()
 
+# Titles are a few words, so they go to a cheaper, faster model than answers.
+TITLE_MODEL_NAME = os.getenv("TITLE_MODEL_NAME", "gpt-4o-mini")
+# Length of the provisional title shown until the generated one is stored.
+PLACEHOLDER_TITLE_LENGTH = 60
+
 class ChatService:
     def __init__(self):
         self.llm = ChatOpenAI(
@@ -14,28 +21,57 @@ class ChatService:
             model_name="gpt-4o",
             openai_api_key=os.getenv("OPENAI_API_KEY")
         )
+        self.title_llm = ChatOpenAI(
+            temperature=0.3,
+            model_name=TITLE_MODEL_NAME,
+            max_tokens=20,
+            openai_api_key=os.getenv("OPENAI_API_KEY")
+        )
         
         self.system_prompt = """You are a helpful AI assistant that provides accurate, 
         informative, and engaging responses. Always strive to give detailed explanations 
         and cite sources when possible."""
 
-    """
-    So here we are passing all the list of messages earlier received as well. 
-    Maybe this helps further in understanding the context & allows for better reasoning as well. 
-    """
-    async def generate_response(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        # Get the latest user message
-        latest_user_message = None
+        self.answer_cache = get_answer_cache()
+
+    @staticmethod
+    def _latest_user_message(messages: List[Dict[str, str]]) -> Optional[str]:
         for msg in reversed(messages):
             if msg["role"] == "user":
-                latest_user_message = msg["content"]
-                break
+                return msg["content"]
+        return None
+
+    @staticmethod
+    def _scope(company_ids: Optional[List[str]]) -> Tuple[str, ...]:
+        return tuple(sorted(str(company_id) for company_id in company_ids)) if company_ids is not None else GLOBAL_SCOPE
+
+    async def _cached_answer(self, messages: List[Dict[str, str]],
+                             company_ids: Optional[List[str]]) -> Tuple[Optional[CachedAnswer], Optional[List[float]]]:
+        """Look a standalone question up in the answer cache for this retrieval scope.
+
+        Returns the cached answer (or None) and the question embedding, which is reused for
+        retrieval on a miss. Follow-up turns depend on earlier messages, so they bypass the cache.
+        """
+        if self.answer_cache is None or len(messages) != 1 or messages[0]["role"] != "user":
+            return None, None
+        embedding = await get_retrieval_clients().aembed_query(messages[0]["content"])
+        return await self.answer_cache.lookup(embedding, self._scope(company_ids)), embedding
+
+    async def _prepare_messages(self, messages: List[Dict[str, str]], embedding: Optional[List[float]] = None,
+                                company_ids: Optional[List[str]] = None) -> Tuple[List[BaseMessage], List[Dict[str, Any]]]:
+        """Run retrieval for the latest user question and build the LangChain prompt.
+        Retrieval is limited to company_ids when given.
+
+        Returns the prompt messages and the citation metadata of the retrieved chunks.
+        """
+        # Get the latest user message
+        latest_user_message = self._latest_user_message(messages)
         
-        # Query vector database with the latest user question
+        # Retrieve chunks (full-text + vector) for the latest user question
         vector_context = []
         doc_metadata = []
         if latest_user_message:
-            vector_results = query_vector_store(latest_user_message, top_k=3)
+            vector_results = await aretrieve(latest_user_message, top_k=3, embedding=embedding, company_ids=company_ids)
             if vector_results:
                 vector_context_text = "Context from knowledge base:\n\n"
                 for doc in vector_results:
@@ -64,15 +100,70 @@ class ChatService:
                 langchain_messages.append(HumanMessage(content=msg["content"]))
             elif msg["role"] == "assistant":
                 langchain_messages.append(AIMessage(content=msg["content"]))
+            elif msg["role"] == "system":
+                # e.g. the rolling summary of turns no longer sent verbatim
+                langchain_messages.append(SystemMessage(content=msg["content"]))
+
+        return langchain_messages, doc_metadata
+
+    """
+    So here we are passing all the list of messages earlier received as well. 
+    Maybe this helps further in understanding the context & allows for better reasoning as well. 
+    """
+    async def generate_response(self, messages: List[Dict[str, str]],
+                                company_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        cached, embedding = await self._cached_answer(messages, company_ids)
+        if cached is not None:
+            return {"content": cached.content, "metadata": cached.metadata}
+
+        started_at = time.perf_counter()
+        langchain_messages, doc_metadata = await self._prepare_messages(messages, embedding, company_ids)
         
-        # Generate response
-        response = self.llm.predict_messages(langchain_messages)
+        # Generate response without blocking the event loop
+        response = await self.llm.ainvoke(langchain_messages)
+
+        if embedding is not None:
+            self.answer_cache.store(
+                messages[0]["content"], embedding, response.content, doc_metadata,
+                scope=self._scope(company_ids), generation_seconds=time.perf_counter() - started_at
+            )
 
         # Return both the response content and document metadata
         return {
             "content": response.content,
             "metadata": doc_metadata
         }
+
+    async def stream_response(self, messages: List[Dict[str, str]],
+                              company_ids: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a response as events.
+
+        Yields a single {"type": "metadata"} event with the retrieval citations as soon
+        as retrieval finishes, followed by one {"type": "token"} event per chunk of
+        generated text. A cached answer arrives as a single token event.
+        """
+        cached, embedding = await self._cached_answer(messages, company_ids)
+        if cached is not None:
+            yield {"type": "metadata", "metadata": cached.metadata}
+            yield {"type": "token", "content": cached.content}
+            return
+
+        started_at = time.perf_counter()
+        langchain_messages, doc_metadata = await self._prepare_messages(messages, embedding, company_ids)
+        yield {"type": "metadata", "metadata": doc_metadata}
+
+        tokens = []
+        async for chunk in self.llm.astream(langchain_messages):
+            if chunk.content:
+                tokens.append(chunk.content)
+                yield {"type": "token", "content": chunk.content}
+
+        # Only completed streams are cached; an abandoned one never reaches this point.
+        if embedding is not None:
+            self.answer_cache.store(
+                messages[0]["content"], embedding, "".join(tokens), doc_metadata,
+                scope=self._scope(company_ids), generation_seconds=time.perf_counter() - started_at
+            )
     
     async def create_chat_title(self, first_message: str) -> str:
         """Generate a title for a new chat based on the first message"""
@@ -81,5 +172,13 @@ class ChatService:
             SystemMessage(content="You are a helpful assistant that generates short, concise chat titles."),
             HumanMessage(content=prompt)
         ]
-        response = self.llm.predict_messages(messages)
-        return response.content.strip('"') 
\ No newline at end of file
+        response = await self.title_llm.ainvoke(messages)
+        return response.content.strip('"')
+
+    @staticmethod
+    def placeholder_title(first_message: str) -> str:
+        """Provisional title taken from the first message, used until the generated one is ready."""
+        title = " ".join(first_message.split())
+        if len(title) > PLACEHOLDER_TITLE_LENGTH:
+            title = title[:PLACEHOLDER_TITLE_LENGTH].rsplit(" ", 1)[0] + "..."
+        return title
\ No newline at end of file
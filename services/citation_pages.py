@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import PyPDF2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CITATION_CACHE_DIR = os.getenv(
+    "CITATION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "citation_pages")
+)
+# Disk budget for extracted pages; least recently served pages are removed beyond it.
+CITATION_CACHE_MAX_BYTES = int(os.getenv("CITATION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Threads extracting pages on a cache miss.
+CITATION_EXTRACT_WORKERS = int(os.getenv("CITATION_EXTRACT_WORKERS", "2"))
+
+
+class PageNotFound(Exception):
+    """The requested page is outside the document."""
+
+
+def _extract_page(pdf_path: str, page_number: int, destination: str):
+    """Write page page_number (1-based) of pdf_path as a single-page PDF at destination."""
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        if page_number < 1 or page_number > len(pdf_reader.pages):
+            raise PageNotFound(f"Page {page_number} does not exist in the PDF.")
+        pdf_writer = PyPDF2.PdfWriter()
+        pdf_writer.add_page(pdf_reader.pages[page_number - 1])
+        # Write beside the destination and rename, so readers never see a partial file.
+        temporary = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as output:
+            pdf_writer.write(output)
+    os.replace(temporary, destination)
+
+
+class CitationPageCache:
+    """
+    Single-page PDFs cut from cited documents, cached on disk.
+
+    Entries are keyed by the source file's path, size and modification time plus the
+    page number, so a re-uploaded file never serves stale pages. The directory is kept
+    under max_bytes by removing the least recently served pages (tracked by file mtime,
+    which a hit refreshes). Misses are extracted on a small thread pool, and concurrent
+    requests for the same page in this process share one extraction.
+
+    get_page returns the cached file's path pinned against eviction; the caller sends
+    it (zero-copy where the server supports it) and then calls release(path).
+    """
+
+    def __init__(self, directory: str = CITATION_CACHE_DIR, max_bytes: int = CITATION_CACHE_MAX_BYTES,
+                 workers: int = CITATION_EXTRACT_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="citation-page")
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        # Guards _bytes and _pins only; no file is read while holding it.
+        self._size_lock = threading.Lock()
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".pdf"))
+        # Responses still sending each cached file; eviction skips pinned files.
+        self._pins: Dict[str, int] = {}
+        self._evicting = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(pdf_path: str, page_number: int) -> str:
+        """
+        Cache key and ETag for one page of the current version of a file.
+
+        Raises:
+            FileNotFoundError: If pdf_path does not exist
+        """
+        path = os.path.realpath(pdf_path)
+        stat = os.stat(path)
+        return hashlib.sha256(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{page_number}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    async def get_page(self, pdf_path: str, page_number: int, key: Optional[str] = None) -> str:
+        """
+        Return the path of a single-page PDF from the cache, extracting it on a miss.
+        The file stays pinned until release(path) is called.
+
+        Raises:
+            FileNotFoundError: If pdf_path does not exist
+            PageNotFound: If the page is outside the document
+        """
+        key = key or self.key(pdf_path, page_number)
+        path = self._path(key)
+        if await asyncio.to_thread(self._acquire, path):
+            self.hits += 1
+            return path
+
+        while True:
+            task = self._in_flight.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.get_running_loop().create_task(self._extract(pdf_path, page_number, path))
+                self._in_flight[key] = task
+                task.add_done_callback(lambda done: self._extracted(key, done))
+            else:
+                self.coalesced += 1
+            # Shielded: a requester that disconnects never cancels the extraction the
+            # others are waiting on; it still finishes and fills the cache.
+            await asyncio.shield(task)
+            # Only a cache far smaller than the working set evicts a page this quickly.
+            if await asyncio.to_thread(self._acquire, path):
+                return path
+
+    async def _extract(self, pdf_path: str, page_number: int, path: str):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._fill, pdf_path, page_number, path)
+
+    def _extracted(self, key: str, task: asyncio.Task):
+        del self._in_flight[key]
+        # Every waiter may have gone; don't let the task log an unretrieved exception.
+        if not task.cancelled():
+            task.exception()
+
+    def _acquire(self, path: str) -> bool:
+        """Pin a cached page and mark it recently used; False if it isn't cached."""
+        with self._size_lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        # Pinned first, so eviction can no longer remove it once it is seen here.
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            self.release(path)
+            return False
+
+    def release(self, path: str):
+        """Unpin a page returned by get_page once its response has been sent."""
+        with self._size_lock:
+            remaining = self._pins[path] - 1
+            if remaining:
+                self._pins[path] = remaining
+            else:
+                del self._pins[path]
+
+    def _fill(self, pdf_path: str, page_number: int, path: str):
+        _extract_page(pdf_path, page_number, path)
+        self._added(os.path.getsize(path), path)
+
+    def _added(self, size: int, added_path: str):
+        with self._size_lock:
+            self._bytes += size
+            if self._bytes <= self.max_bytes or self._evicting:
+                return
+            self._evicting = True
+        try:
+            # Scanned without the lock; hits keep being served meanwhile.
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pdf"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            with self._size_lock:
+                self._bytes = sum(size for _, size, _ in entries)
+            # Evict down to 90% so every miss at the limit doesn't trigger a scan.
+            target = int(self.max_bytes * 0.9)
+            for _, size, path in entries:
+                with self._size_lock:
+                    if self._bytes <= target:
+                        break
+                    # In use by a response, or not yet picked up by the requests that filled it.
+                    if path in self._pins or path == added_path:
+                        continue
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    self._bytes -= size
+                    self.evictions += 1
+        finally:
+            self._evicting = False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+citation_page_cache = CitationPageCache()
@@ -0,0 +1,189 @@
+import asyncio
+import heapq
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from database.db import AsyncSessionLocal
+from database.models import Company
+
+load_dotenv()
+
+# How often the companies table is checked for changes made by other processes.
+COMPANY_INDEX_REFRESH_SECONDS = float(os.getenv("COMPANY_INDEX_REFRESH_SECONDS", "30"))
+# Longest prefix indexed per word; longer queries are checked against the candidates directly.
+MAX_PREFIX_LENGTH = 12
+
+# Score bands, highest first; ties are broken by the shorter, then alphabetically earlier name.
+EXACT_TICKER = 100.0
+TICKER_PREFIX = 80.0
+NAME_PREFIX = 60.0
+WORD_PREFIX = 50.0
+# Trigram matches score up to this, scaled by similarity.
+TRIGRAM_MAX = 40.0
+# Minimum trigram similarity for an infix or misspelt match to be returned.
+MIN_TRIGRAM_SIMILARITY = 0.3
+# Words nearly every listed name carries; indexing them would make "l" match everything.
+STOPWORDS = {"ltd", "limited", "the", "and", "of", "co", "pvt", "private"}
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyEntry:
+    __slots__ = ("id", "ticker", "name", "created_at", "ticker_key", "name_key", "words", "grams")
+
+    def __init__(self, id: UUID, ticker: str, name: str, created_at: datetime):
+        self.id = id
+        self.ticker = ticker
+        self.name = name
+        self.created_at = created_at
+        self.ticker_key = normalize(ticker)
+        self.name_key = normalize(name)
+        self.words = [word for word in self.name_key.split() if word not in STOPWORDS] + self.ticker_key.split()
+        self.grams = trigrams(self.name_key) | trigrams(self.ticker_key)
+
+
+class CompanyIndex:
+    """
+    In-memory search index over company names and tickers for search-as-you-type.
+
+    Word prefixes map to companies for the common case of typing the start of a name or
+    ticker; trigrams catch text from the middle of a name and small typos. The whole
+    index is rebuilt when the table's contents change, which is detected by polling a
+    cheap signature of the table every COMPANY_INDEX_REFRESH_SECONDS.
+    """
+
+    def __init__(self, refresh_seconds: float = COMPANY_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._entries: List[CompanyEntry] = []
+        self._prefixes: Dict[str, Set[int]] = {}
+        self._grams: Dict[str, Set[int]] = {}
+        self._signature: Optional[Tuple[Any, ...]] = None
+        self._checked_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self.rebuilds = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def build(self, companies: List[Tuple[UUID, str, str, datetime]]):
+        entries = [CompanyEntry(*company) for company in companies]
+        prefixes: Dict[str, Set[int]] = {}
+        grams: Dict[str, Set[int]] = {}
+        for position, entry in enumerate(entries):
+            for word in entry.words:
+                for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                    prefixes.setdefault(word[:length], set()).add(position)
+            for gram in entry.grams:
+                grams.setdefault(gram, set()).add(position)
+        # Swap in one step so concurrent searches see either the old or the new index.
+        self._entries, self._prefixes, self._grams = entries, prefixes, grams
+        self.rebuilds += 1
+
+    async def refresh_if_due(self):
+        if self._signature is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        async with self._refresh_lock:
+            if self._signature is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return
+            async with AsyncSessionLocal() as db:
+                signature = tuple((await db.execute(
+                    select(
+                        func.count(Company.id),
+                        func.max(Company.created_at),
+                        func.md5(func.string_agg(
+                            func.concat(Company.ticker, "|", Company.name), aggregate_order_by(",", Company.id)
+                        ))
+                    )
+                )).one())
+                if signature != self._signature:
+                    rows = (await db.execute(select(Company.id, Company.ticker, Company.name, Company.created_at))).all()
+                    self.build([tuple(row) for row in rows])
+                    self._signature = signature
+            self._checked_at = time.monotonic()
+
+    @staticmethod
+    def _prefix_score(entry: CompanyEntry, query: str) -> float:
+        """Score of a company that has a word starting with every query word."""
+        if entry.ticker_key == query:
+            return EXACT_TICKER
+        if entry.ticker_key.startswith(query):
+            return TICKER_PREFIX
+        if entry.name_key.startswith(query):
+            return NAME_PREFIX
+        return WORD_PREFIX
+
+    @staticmethod
+    def _trigram_score(entry: CompanyEntry, query_grams: Set[str]) -> float:
+        similarity = len(query_grams & entry.grams) / len(query_grams | entry.grams) if query_grams else 0.0
+        # Also accept a query that appears almost entirely inside a longer name.
+        containment = len(query_grams & entry.grams) / len(query_grams) if query_grams else 0.0
+        similarity = max(similarity, containment * 0.8)
+        return TRIGRAM_MAX * similarity if similarity >= MIN_TRIGRAM_SIMILARITY else 0.0
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[CompanyEntry, float]]:
+        started_at = time.perf_counter()
+        entries, prefixes, grams = self._entries, self._prefixes, self._grams
+        query = normalize(query)
+        query_words = query.split()
+        if not query_words:
+            return []
+
+        # Companies having a word that starts with every query word...
+        candidates: Optional[Set[int]] = None
+        for word in query_words:
+            matches = prefixes.get(word[:MAX_PREFIX_LENGTH], set())
+            candidates = set(matches) if candidates is None else candidates & matches
+        long_words = [word for word in query_words if len(word) > MAX_PREFIX_LENGTH]
+        if long_words:
+            candidates = {position for position in candidates
+                          if all(any(word.startswith(long_word) for word in entries[position].words) for long_word in long_words)}
+        scored = [(entries[position], self._prefix_score(entries[position], query)) for position in candidates]
+
+        # ...plus, when prefixes don't fill the page, ones sharing enough trigrams with
+        # the query, for infix and misspelt matches.
+        if len(scored) < limit:
+            query_grams = trigrams(query)
+            shared: Dict[int, int] = {}
+            for gram in query_grams:
+                for position in grams.get(gram, ()):
+                    shared[position] = shared.get(position, 0) + 1
+            needed = MIN_TRIGRAM_SIMILARITY * len(query_grams)
+            for position, count in shared.items():
+                if count >= needed and position not in candidates:
+                    score = self._trigram_score(entries[position], query_grams)
+                    if score > 0:
+                        scored.append((entries[position], score))
+
+        best = heapq.nsmallest(limit, scored, key=lambda match: (-match[1], len(match[0].name), match[0].name))
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started_at
+        return best
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "companies": len(self._entries),
+            "prefixes": len(self._prefixes),
+            "trigrams": len(self._grams),
+            "rebuilds": self.rebuilds,
+            "queries": self.queries,
+            "avg_query_ms": round(1000 * self.query_seconds / self.queries, 3) if self.queries else None,
+        }
+
+
+company_index = CompanyIndex()
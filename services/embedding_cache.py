@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from services.cache import LRUTTLCache
+
+load_dotenv()
+
+# "memory" keeps a cache per process, "sqlite" shares one file between the uvicorn
+# workers on a host, "none" disables caching.
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/tmp/veritaforge_embedding_cache.sqlite3")
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, unicode forms, whitespace and trailing punctuation so near-identical questions share a key."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.")
+
+
+class EmbeddingCacheBackend(ABC):
+    """Storage for cached embeddings. Keys are opaque strings."""
+
+    # Whether get/set may block on I/O and should be kept off the event loop.
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[List[float]]:
+        """The cached embedding for key, or None on a miss."""
+
+    @abstractmethod
+    def set(self, key: str, embedding: List[float]):
+        """Store an embedding under key."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryEmbeddingCacheBackend(EmbeddingCacheBackend):
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS):
+        self._cache = LRUTTLCache(max_entries, ttl_seconds)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self._cache.get(key)
+
+    def set(self, key: str, embedding: List[float]):
+        self._cache.set(key, embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        return {"entries": stats["entries"], "evictions": stats["evictions"], "expirations": stats["expirations"]}
+
+
+class SqliteEmbeddingCacheBackend(EmbeddingCacheBackend):
+    """
+    File-backed cache shared by every worker process on the host.
+    Recency is tracked per row and the table is trimmed back to max_entries
+    by least recent use every few writes.
+
+    The cache is an optimisation, so a sqlite error (e.g. "database is locked" under
+    write contention) counts as a miss on get and is dropped on set rather than
+    failing the request.
+    """
+
+    blocking = True
+    # How many writes happen between eviction passes.
+    TRIM_EVERY = 100
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None
+        self._local = threading.local()
+        self._writes = 0
+        self.errors = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections cannot be shared across threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _failed(self, operation: str, error: sqlite3.Error):
+        self.errors += 1
+        print(f"Embedding cache {operation} failed, continuing without the cache: {error}")
+
+    def get(self, key: str) -> Optional[List[float]]:
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT embedding, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            blob, created_at = row
+            now = time.time()
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return None
+        return array("f", blob).tolist()
+
+    def set(self, key: str, embedding: List[float]):
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, array("f", embedding).tobytes(), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.TRIM_EVERY == 0:
+                self._trim(conn, now)
+        except sqlite3.Error as e:
+            self._failed("write", e)
+
+    def _trim(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            (entries,) = self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        except sqlite3.Error:
+            entries = None
+        return {"entries": entries, "errors": self.errors}
+
+
+class EmbeddingCache:
+    """
+    Query-embedding cache keyed on the normalized query text and the embedding model.
+    Hit and miss counters are per process regardless of backend.
+    """
+
+    def __init__(self, backend: EmbeddingCacheBackend, model_name: str):
+        self.backend = backend
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        embedding = self.backend.get(self.key(text))
+        if embedding is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return embedding
+
+    def set(self, text: str, embedding: List[float]):
+        self.backend.set(self.key(text), embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            **self.backend.stats(),
+        }
+
+
+def build_embedding_cache(model_name: str, backend: str = EMBEDDING_CACHE_BACKEND) -> Optional[EmbeddingCache]:
+    """Create the cache configured by EMBEDDING_CACHE_BACKEND, or None when disabled."""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return EmbeddingCache(MemoryEmbeddingCacheBackend(), model_name)
+    if backend == "sqlite":
+        return EmbeddingCache(SqliteEmbeddingCacheBackend(), model_name)
+    raise ValueError(f"Unknown EMBEDDING_CACHE_BACKEND: {backend}")
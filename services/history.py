@@ -0,0 +1,171 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+import tiktoken
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db import AsyncSessionLocal
+from database.models import Chat, Message
+
+load_dotenv()
+
+# Tokens of recent conversation sent verbatim with each turn; older turns are summarised.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Cheaper model used to maintain the rolling summary off the request path.
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "400"))
+
+SUMMARY_PROMPT = """Maintain a running summary of a research conversation between an analyst and an AI assistant.
+
+Current summary:
+{summary}
+
+Messages to fold into the summary:
+{messages}
+
+Rewrite the summary to include the new messages. Keep company names, figures, periods and
+open questions; drop pleasantries. Respond with the summary only, under {max_words} words."""
+
+
+class HistoryManager:
+    """
+    Keeps the prompt for a chat turn bounded: the newest messages are sent verbatim
+    up to a token budget, everything older is represented by Chat.summary.
+
+    The summary is refreshed in a background task after the response, folding in
+    messages that have fallen out of the verbatim window, so no turn waits on it.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._encoding = None
+        self._llm = None
+        # Chats with a refresh in progress in this process.
+        self._refreshing: Set[UUID] = set()
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        if self._llm is None:
+            self._llm = ChatOpenAI(
+                temperature=0,
+                model_name=HISTORY_SUMMARY_MODEL,
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+                openai_api_key=os.getenv("OPENAI_API_KEY")
+            )
+        return self._llm
+
+    def load_encoding(self):
+        """Load the tokenizer, which may download and build its BPE tables; blocking."""
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # Encoding files unavailable (offline); fall back to the usual ~4 chars per token.
+                self._encoding = False
+
+    async def warmup(self):
+        """Load the tokenizer on a worker thread at startup, so no request loads it on the event loop."""
+        await asyncio.to_thread(self.load_encoding)
+
+    def count_tokens(self, text: str) -> int:
+        # The API loads the encoding in its lifespan hook; scripts load it on first use.
+        self.load_encoding()
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def split(self, messages: List[Message]) -> Tuple[List[Message], List[Message]]:
+        """
+        Split chronologically ordered messages into (older, recent): recent is the longest
+        suffix that fits the token budget, and always contains at least the newest message.
+        """
+        used = 0
+        start = len(messages)
+        while start > 0:
+            cost = self.count_tokens(messages[start - 1].content or "")
+            if start < len(messages) and used + cost > self.token_budget:
+                break
+            used += cost
+            start -= 1
+        return messages[:start], messages[start:]
+
+    async def load_unsummarized(self, db: AsyncSession, chat: Chat) -> List[Message]:
+        """Messages newer than the summary, oldest first."""
+        query = select(Message).where(Message.chat_id == chat.id)
+        if chat.summarized_until is not None:
+            query = query.where(Message.created_at > chat.summarized_until)
+        return list((await db.execute(query.order_by(Message.created_at))).scalars().all())
+
+    def build_prompt_history(self, chat: Chat, messages: List[Message]) -> Tuple[List[Dict[str, str]], bool]:
+        """
+        Return the history to send to the LLM and whether the summary needs refreshing
+        because some messages no longer fit the verbatim window.
+        """
+        older, recent = self.split(messages)
+        history = []
+        if chat.summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{chat.summary}"})
+        elif older:
+            # The first summary is still being written; say so rather than exceed the budget.
+            history.append({"role": "system", "content": "Earlier turns of this conversation are omitted."})
+        history.extend({"role": msg.role, "content": msg.content} for msg in recent)
+        return history, bool(older)
+
+    async def refresh_summary(self, chat_id: UUID):
+        """Fold messages that fell out of the verbatim window into Chat.summary."""
+        if chat_id in self._refreshing:
+            return
+        self._refreshing.add(chat_id)
+        try:
+            chat, messages = await self._load_chat(chat_id)
+            if chat is None:
+                return
+            older, _ = self.split(messages)
+            if not older:
+                return
+
+            transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in older)
+            prompt = SUMMARY_PROMPT.format(
+                summary=chat.summary or "(none yet)",
+                messages=transcript,
+                max_words=int(HISTORY_SUMMARY_MAX_TOKENS * 0.75)
+            )
+            response = await self.llm.ainvoke([
+                SystemMessage(content="You write concise, factual conversation summaries."),
+                HumanMessage(content=prompt)
+            ])
+            await self._save_summary(chat_id, chat.summarized_until, response.content, older[-1].created_at)
+        except Exception as e:
+            # A failed refresh only means the next turn carries a slightly longer gap.
+            print(f"Summary refresh failed for chat {chat_id}: {e}")
+        finally:
+            self._refreshing.discard(chat_id)
+
+    async def _load_chat(self, chat_id: UUID) -> Tuple[Optional[Chat], List[Message]]:
+        async with AsyncSessionLocal() as db:
+            chat = await db.get(Chat, chat_id)
+            if chat is None:
+                return None, []
+            return chat, await self.load_unsummarized(db, chat)
+
+    @staticmethod
+    async def _save_summary(chat_id: UUID, previous_until: Optional[datetime], summary: str, summarized_until: datetime):
+        # Only apply if no other worker advanced the summary in the meantime.
+        statement = update(Chat).where(Chat.id == chat_id)
+        if previous_until is None:
+            statement = statement.where(Chat.summarized_until.is_(None))
+        else:
+            statement = statement.where(Chat.summarized_until == previous_until)
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement.values(summary=summary, summarized_until=summarized_until))
+            await db.commit()
+
+
+history_manager = HistoryManager()
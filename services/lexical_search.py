@@ -0,0 +1,54 @@
+import re
+from typing import List, Optional
+
+from langchain.schema.document import Document as LangchainDocument
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Chunk, Document
+from services.vector_store.base import chunk_document
+
+# Text search configuration; must match the one used by Chunk.search_vector.
+TEXT_SEARCH_CONFIG = "english"
+
+
+def build_tsquery(query_text: str) -> str:
+    """
+    OR together every word of the question. Exact tokens such as "QIP", "ARPOB" or a
+    ticker then match even when the rest of the question does not; ranking rewards
+    chunks that match more of the words.
+    """
+    terms = re.findall(r"[A-Za-z0-9]+", query_text)
+    return " | ".join(terms)
+
+
+async def lexical_search(db: AsyncSession, query_text: str, top_k: int = 20,
+                         company_ids: Optional[List[str]] = None) -> List[LangchainDocument]:
+    """
+    Rank chunks by full-text match against the GIN-indexed Chunk.search_vector,
+    optionally restricted to the given companies.
+
+    Returns documents in the same shape as vector search results, best first.
+    """
+    tsquery_text = build_tsquery(query_text)
+    if not tsquery_text:
+        return []
+    tsquery = func.to_tsquery(TEXT_SEARCH_CONFIG, tsquery_text)
+    rank = func.ts_rank_cd(Chunk.search_vector, tsquery)
+
+    query = (
+        select(
+            Chunk.id, Chunk.text, Chunk.context, Chunk.document_id, Chunk.company_id,
+            Document.file_path, Document.page_number
+        )
+        .join(Document, Chunk.document_id == Document.id)
+        .where(Chunk.search_vector.op("@@")(tsquery))
+    )
+    if company_ids is not None:
+        query = query.where(Chunk.company_id.in_(company_ids))
+    rows = (await db.execute(
+        query
+        .order_by(rank.desc())
+        .limit(top_k)
+    )).all()
+    return [chunk_document(*row) for row in rows]
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+from langchain.schema.document import Document as LangchainDocument
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.db import AsyncSessionLocal
+from services.embedding_cache import build_embedding_cache
+from services.lexical_search import lexical_search
+from services.vector_store import build_vector_store
+
+load_dotenv()
+
+# Size of the keep-alive pools towards OpenAI and Pinecone.
+RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", "20"))
+# How long an idle connection is kept open before it is dropped.
+RETRIEVAL_KEEPALIVE_SECONDS = float(os.getenv("RETRIEVAL_KEEPALIVE_SECONDS", "120"))
+# Fuse Postgres full-text hits with vector hits; off means vector search only.
+RETRIEVAL_HYBRID = os.getenv("RETRIEVAL_HYBRID", "true").lower() in ("1", "true", "yes")
+# Candidates taken from each of the lexical and vector rankings before fusion.
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Reciprocal rank fusion damping constant; larger values flatten the rank weighting.
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+class _CallStats:
+    """Counters for one kind of outbound call."""
+
+    def __init__(self):
+        # Searches run on worker threads, so updates are serialised.
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_seconds = 0.0
+
+    def started(self) -> float:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def finished(self, started_at: float, failed: bool = False):
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self.in_flight -= 1
+            self.total_seconds += elapsed
+            if failed:
+                self.errors += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_ms": round(1000 * self.total_seconds / self.calls, 2) if self.calls else None,
+        }
+
+
+class RetrievalClients:
+    """
+    Long-lived embedding and vector-store clients shared by every chat turn.
+
+    Everything that is expensive to build - HTTP connection pools, the vector
+    store client (and for Pinecone the index host lookup) - is created once,
+    so a query only pays for the embedding call and the search itself.
+    """
+
+    def __init__(self, pool_size: int = RETRIEVAL_POOL_SIZE, keepalive_seconds: float = RETRIEVAL_KEEPALIVE_SECONDS):
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.ready = False
+        self.warmup_error: Optional[str] = None
+
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_seconds
+        )
+        self.http_client = httpx.Client(limits=limits)
+        self.http_async_client = httpx.AsyncClient(limits=limits)
+
+        self._embeddings: Optional[OpenAIEmbeddings] = None
+        self._vector_store = None
+        self._embedding_cache = None
+        self._built = False
+        self._build_lock = threading.Lock()
+
+        self._embed_stats = _CallStats()
+        self._search_stats = _CallStats()
+        self._lexical_stats = _CallStats()
+
+        # A missing key or bad backend config must not stop the API from starting;
+        # the error is reported by /health/ready and construction is retried on use.
+        try:
+            self._build_clients()
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Retrieval clients could not be created: {e}")
+
+    def _build_clients(self):
+        """
+        Create the embeddings model, vector store and embedding cache if not done yet.
+
+        Raises:
+            Exception: Whatever the client constructors raise for missing keys or bad config
+        """
+        if self._built:
+            return
+        with self._build_lock:
+            if self._built:
+                return
+            embeddings = OpenAIEmbeddings(
+                openai_api_key=os.environ.get("OPENAI_API_KEY"),
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
+            )
+            vector_store = build_vector_store(pool_size=self.pool_size)
+            self._embedding_cache = build_embedding_cache(embeddings.model)
+            self._embeddings, self._vector_store = embeddings, vector_store
+            self._built = True
+
+    @property
+    def embeddings(self) -> OpenAIEmbeddings:
+        self._build_clients()
+        return self._embeddings
+
+    @property
+    def vector_store(self):
+        self._build_clients()
+        return self._vector_store
+
+    @property
+    def embedding_cache(self):
+        self._build_clients()
+        return self._embedding_cache
+
+    async def aembed_query(self, text: str) -> List[float]:
+        cache = self.embedding_cache
+        if cache is not None:
+            embedding = await self._run_cache(cache.get, text)
+            if embedding is not None:
+                return embedding
+
+        started_at = self._embed_stats.started()
+        try:
+            embedding = await self.embeddings.aembed_query(text)
+        except Exception:
+            self._embed_stats.finished(started_at, failed=True)
+            raise
+        self._embed_stats.finished(started_at)
+
+        if cache is not None:
+            await self._run_cache(cache.set, text, embedding)
+        return embedding
+
+    def embed_query(self, text: str) -> List[float]:
+        cache = self.embedding_cache
+        if cache is not None:
+            embedding = cache.get(text)
+            if embedding is not None:
+                return embedding
+        embedding = self.embeddings.embed_query(text)
+        if cache is not None:
+            cache.set(text, embedding)
+        return embedding
+
+    async def _run_cache(self, fn, *args):
+        if self.embedding_cache.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def search_by_vector(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                         company_ids: Optional[List[str]] = None):
+        """Vector search over the given companies' partitions, or over every partition when None."""
+        started_at = self._search_stats.started()
+        try:
+            results = self.vector_store.query(embedding, top_k=top_k, filter=filter, partitions=company_ids)
+        except Exception:
+            self._search_stats.finished(started_at, failed=True)
+            raise
+        self._search_stats.finished(started_at)
+        return [document for document, _ in results]
+
+    async def asearch_by_vector(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                                company_ids: Optional[List[str]] = None):
+        # Searches are synchronous (Pinecone's client is thread-safe, the local index is
+        # CPU-bound NumPy that releases the GIL), so they run on a worker thread.
+        return await asyncio.to_thread(self.search_by_vector, embedding, top_k, filter, company_ids)
+
+    async def alexical_search(self, query_text: str, top_k: int = RETRIEVAL_CANDIDATES,
+                              company_ids: Optional[List[str]] = None) -> List[LangchainDocument]:
+        """
+        Full-text search over chunks. A database error degrades retrieval to
+        vector-only for this turn instead of failing it.
+        """
+        started_at = self._lexical_stats.started()
+        try:
+            async with AsyncSessionLocal() as db:
+                results = await lexical_search(db, query_text, top_k, company_ids)
+        except SQLAlchemyError as e:
+            self._lexical_stats.finished(started_at, failed=True)
+            print(f"Lexical search failed, using vector results only: {e}")
+            return []
+        self._lexical_stats.finished(started_at)
+        return results
+
+    async def warmup(self):
+        """
+        Open pooled connections to both services before the app reports ready.
+        Failures are recorded rather than raised so the process still starts;
+        /health/ready reports the error until a later warmup succeeds.
+        """
+        try:
+            await asyncio.to_thread(self._build_clients)
+            await asyncio.to_thread(self.vector_store.warmup)
+            # Bypass the embedding cache so a real connection is opened.
+            embedding = await self.embeddings.aembed_query("warmup")
+            await self.asearch_by_vector(embedding, top_k=1)
+        except Exception as e:
+            self.ready = False
+            self.warmup_error = str(e)
+            print(f"Retrieval warmup failed: {e}")
+            return
+        self.ready = True
+        self.warmup_error = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warmup_error": self.warmup_error,
+            "pool_size": self.pool_size,
+            "keepalive_seconds": self.keepalive_seconds,
+            "embeddings": self._embed_stats.as_dict(),
+            "vector_search": self._search_stats.as_dict(),
+            "vector_store": self._vector_store.stats() if self._vector_store else None,
+            "lexical_search": self._lexical_stats.as_dict(),
+            "embedding_cache": self._embedding_cache.stats() if self._embedding_cache else None,
+        }
+
+    async def close(self):
+        self.ready = False
+        await self.http_async_client.aclose()
+        self.http_client.close()
+        if self._vector_store is not None:
+            self._vector_store.close()
+
+
+def reciprocal_rank_fusion(rankings: List[List[LangchainDocument]], top_k: int, k: int = RRF_K) -> List[LangchainDocument]:
+    """Merge rankings by summing 1 / (k + rank) per chunk; chunks found by several rankings rise."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, LangchainDocument] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.metadata.get("chunk_id") or document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            documents.setdefault(key, document)
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [documents[key] for key in best]
+
+
+async def aretrieve(query_text: str, top_k: int = 3, embedding: Optional[List[float]] = None,
+                    company_ids: Optional[List[str]] = None) -> List[LangchainDocument]:
+    """
+    Retrieve the chunks to ground an answer in. With RETRIEVAL_HYBRID on, full-text
+    and vector rankings are fetched concurrently and fused with reciprocal rank fusion.
+    
+    Args:
+        query_text: The question to retrieve for
+        top_k: Number of chunks to return
+        embedding: Precomputed embedding of query_text, if the caller has one
+        company_ids: Companies to search; None searches every company
+    """
+    clients = get_retrieval_clients()
+
+    async def vector_ranking(candidates: int) -> List[LangchainDocument]:
+        query_embedding = embedding if embedding is not None else await clients.aembed_query(query_text)
+        return await clients.asearch_by_vector(query_embedding, top_k=candidates, company_ids=company_ids)
+
+    if not RETRIEVAL_HYBRID:
+        return await vector_ranking(top_k)
+
+    vector_results, lexical_results = await asyncio.gather(
+        vector_ranking(RETRIEVAL_CANDIDATES),
+        clients.alexical_search(query_text, RETRIEVAL_CANDIDATES, company_ids)
+    )
+    return reciprocal_rank_fusion([vector_results, lexical_results], top_k)
+
+
+_retrieval_clients: Optional[RetrievalClients] = None
+
+
+def get_retrieval_clients() -> RetrievalClients:
+    """
+    Return the process-wide retrieval clients, creating them on first use.
+    The API builds them at startup; scripts get them lazily.
+    """
+    global _retrieval_clients
+    if _retrieval_clients is None:
+        _retrieval_clients = RetrievalClients()
+    return _retrieval_clients
+
+
+async def close_retrieval_clients():
+    global _retrieval_clients
+    if _retrieval_clients is not None:
+        await _retrieval_clients.close()
+        _retrieval_clients = None
@@ -0,0 +1,33 @@
+"""
+Vector store backends for chunk embeddings.
+"""
+import os
+
+from dotenv import load_dotenv
+
+from services.vector_store.base import VectorStore
+from services.vector_store.numpy_store import NumpyStore
+from services.vector_store.pinecone_store import PineconeStore
+
+load_dotenv()
+
+# "pinecone" for the hosted index, "local" for the in-process memory-mapped index.
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+LOCAL_VECTOR_STORE_PATH = os.getenv(
+    "LOCAL_VECTOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "vector_index")
+)
+# Store local vectors as int8 with a per-row scale, a quarter of the float32 size.
+LOCAL_VECTOR_STORE_QUANTIZE = os.getenv("LOCAL_VECTOR_STORE_QUANTIZE", "false").lower() in ("1", "true", "yes")
+
+
+def build_vector_store(backend: str = VECTOR_STORE_BACKEND, pool_size: int = 20) -> VectorStore:
+    """Create the vector store configured by VECTOR_STORE_BACKEND."""
+    if backend == "pinecone":
+        return PineconeStore(pool_size=pool_size)
+    if backend == "local":
+        return NumpyStore(LOCAL_VECTOR_STORE_PATH, quantize=LOCAL_VECTOR_STORE_QUANTIZE)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+
+
+__all__ = ["VectorStore", "PineconeStore", "NumpyStore", "build_vector_store"]
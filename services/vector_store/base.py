@@ -0,0 +1,84 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema.document import Document as LangchainDocument
+
+# Metadata key under which the embedded text is stored alongside each vector.
+# Matches what langchain_pinecone wrote for existing Pinecone indexes.
+TEXT_KEY = "text"
+
+# Partition holding vectors written without one (everything ingested before partitioning).
+DEFAULT_PARTITION = ""
+
+
+class VectorStore(ABC):
+    """
+    Storage and similarity search for chunk embeddings.
+
+    Vectors live in partitions (Pinecone namespaces, local sub-indexes); ingestion
+    writes one partition per company so a scoped query only touches the companies
+    it asks about. Vectors are identified by chunk id, so re-ingesting a chunk
+    replaces its vector instead of adding a duplicate. Filters use the Pinecone
+    metadata filter syntax: {"key": value}, {"key": {"$eq": value}} or {"key": {"$in": [...]}}.
+    """
+
+    def ensure_index(self, dimension: int):
+        """Create the underlying index if it does not exist yet."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]],
+               partition: str = DEFAULT_PARTITION):
+        """Insert or replace vectors by id."""
+
+    @abstractmethod
+    def delete(self, ids: List[str], partition: str = DEFAULT_PARTITION):
+        """Remove vectors by id; unknown ids are ignored."""
+
+    @abstractmethod
+    def delete_partition(self, partition: str):
+        """Drop every vector in a partition."""
+
+    @abstractmethod
+    def query(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+              partitions: Optional[List[str]] = None) -> List[Tuple[LangchainDocument, float]]:
+        """
+        Return the top_k most similar chunks as (document, cosine score), best first.
+        partitions limits the search to those partitions; None searches all of them.
+        """
+
+    def flush(self):
+        """Make pending writes durable and visible to readers. A no-op for remote stores."""
+
+    def warmup(self):
+        """Open connections or page in data before serving queries."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self):
+        pass
+
+
+def merge_results(results: List[List[Tuple[LangchainDocument, float]]], top_k: int) -> List[Tuple[LangchainDocument, float]]:
+    """Combine per-partition results into one ranking by score."""
+    merged = [result for partition_results in results for result in partition_results]
+    merged.sort(key=lambda result: result[1], reverse=True)
+    return merged[:top_k]
+
+
+def chunk_document(chunk_id, text: Optional[str], context: Optional[str], document_id, company_id,
+                   file_path: Optional[str], page_number: Optional[int]) -> LangchainDocument:
+    """
+    Build the retrievable form of a chunk: context and text as content, plus the
+    citation metadata the chat API returns. Used for both vector and lexical hits.
+    """
+    return LangchainDocument(
+        page_content=f"Context: {context}\n\nContent: {text}",
+        metadata={
+            "chunk_id": str(chunk_id),
+            "document_id": str(document_id),
+            "company_id": str(company_id),
+            "file_path": file_path or "",
+            "page_number": page_number or 0
+        }
+    )
@@ -0,0 +1,383 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema.document import Document as LangchainDocument
+
+from services.vector_store.base import DEFAULT_PARTITION, VectorStore, merge_results
+
+# Pointer file naming the snapshot directory readers should load.
+CURRENT_FILE = "CURRENT"
+# How often readers look for a newer snapshot written by another process.
+RELOAD_CHECK_SECONDS = 1.0
+# int8 rows are dequantised in blocks of this many rows to bound scratch memory.
+SCORE_BLOCK_ROWS = 16384
+# Older snapshot directories kept around for readers that still map them.
+SNAPSHOTS_TO_KEEP = 2
+# Directory name used for DEFAULT_PARTITION.
+DEFAULT_PARTITION_DIR = "_default"
+
+
+class _Snapshot:
+    """One immutable, fully written version of the index."""
+
+    def __init__(self, vectors: np.ndarray, scales: Optional[np.ndarray], ids: List[str],
+                 texts: List[str], metadatas: List[Dict[str, Any]]):
+        self.vectors = vectors
+        self.scales = scales
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.row_of = {id: row for row, id in enumerate(ids)}
+        self._columns: Dict[str, Tuple[np.ndarray, Dict[str, int]]] = {}
+        self._columns_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def column(self, key: str) -> Tuple[np.ndarray, Dict[str, int]]:
+        """Dictionary-encode one metadata field so filters become integer comparisons."""
+        column = self._columns.get(key)
+        if column is None:
+            with self._columns_lock:
+                column = self._columns.get(key)
+                if column is None:
+                    vocab: Dict[str, int] = {}
+                    codes = np.fromiter(
+                        (vocab.setdefault(str(metadata.get(key)), len(vocab)) for metadata in self.metadatas),
+                        dtype=np.int32,
+                        count=len(self.metadatas)
+                    )
+                    column = (codes, vocab)
+                    self._columns[key] = column
+        return column
+
+
+def _empty_snapshot() -> _Snapshot:
+    return _Snapshot(np.zeros((0, 0), dtype=np.float32), None, [], [], [])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantisation of unit vectors."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class NumpyIndex:
+    """
+    One partition of the local vector index, stored as memory-mapped NumPy files.
+
+    Each snapshot directory holds:
+        vectors.npy    (N, D) unit-normalised float32 rows, or int8 rows when quantized
+        scales.npy     (N,) float32 per-row scale, only for int8 snapshots
+        metadata.json  ids, texts and metadata, in row order
+
+    Snapshots are loaded with mmap, so startup is zero-copy and every worker
+    process on the host shares the same page cache. Writes are buffered until
+    flush(), which writes a new snapshot and atomically repoints CURRENT at it.
+    Readers in other processes pick the new snapshot up on their next query.
+    """
+
+    def __init__(self, path: str, quantize: bool = False):
+        self.path = path
+        self.quantize = quantize
+        self._write_lock = threading.Lock()
+        self._pending: Dict[str, Tuple[np.ndarray, str, Dict[str, Any]]] = {}
+        self._deleted: set = set()
+        self._snapshot = _empty_snapshot()
+        self._snapshot_name: Optional[str] = None
+        self._last_reload_check = 0.0
+        self.queries = 0
+        os.makedirs(path, exist_ok=True)
+        self._reload()
+
+    # Reading
+
+    def _current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        name = self._current_name()
+        if name is None or name == self._snapshot_name:
+            return
+        directory = os.path.join(self.path, name)
+        with open(os.path.join(directory, "metadata.json")) as f:
+            sidecar = json.load(f)
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        scales = None
+        if sidecar.get("quantized"):
+            scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+        self._snapshot = _Snapshot(vectors, scales, sidecar["ids"], sidecar["texts"], sidecar["metadatas"])
+        self._snapshot_name = name
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_reload_check >= RELOAD_CHECK_SECONDS:
+            self._last_reload_check = now
+            self._reload()
+
+    def _mask(self, snapshot: _Snapshot, filter: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(len(snapshot), dtype=bool)
+        for key, condition in filter.items():
+            if isinstance(condition, dict):
+                if "$eq" in condition:
+                    values = [condition["$eq"]]
+                elif "$in" in condition:
+                    values = condition["$in"]
+                else:
+                    raise ValueError(f"Unsupported filter operator for '{key}': {list(condition)}")
+            else:
+                values = [condition]
+            codes, vocab = snapshot.column(key)
+            wanted = [vocab[str(value)] for value in values if str(value) in vocab]
+            mask &= np.isin(codes, wanted)
+        return mask
+
+    def _scores(self, snapshot: _Snapshot, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        if snapshot.scales is None:
+            vectors = snapshot.vectors if rows is None else snapshot.vectors[rows]
+            return vectors @ query
+        count = len(snapshot) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+            block = snapshot.vectors[block_rows].astype(np.float32)
+            scores[start:end] = (block @ query) * snapshot.scales[block_rows]
+        return scores
+
+    def query(self, embedding: List[float], top_k: int = 5,
+              filter: Optional[Dict[str, Any]] = None) -> List[Tuple[LangchainDocument, float]]:
+        self._maybe_reload()
+        snapshot = self._snapshot
+        self.queries += 1
+        if len(snapshot) == 0 or top_k <= 0:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        rows = np.flatnonzero(self._mask(snapshot, filter)) if filter else None
+        if rows is not None and len(rows) == 0:
+            return []
+
+        scores = self._scores(snapshot, query, rows)
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        results = []
+        for position in best:
+            row = int(position if rows is None else rows[position])
+            document = LangchainDocument(page_content=snapshot.texts[row], metadata=dict(snapshot.metadatas[row]))
+            results.append((document, float(scores[position])))
+        return results
+
+    # Writing
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._write_lock:
+            for id, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+                self._pending[id] = (vector, text, metadata)
+                self._deleted.discard(id)
+
+    def delete(self, ids: List[str]):
+        with self._write_lock:
+            for id in ids:
+                self._pending.pop(id, None)
+                self._deleted.add(id)
+
+    def flush(self):
+        with self._write_lock:
+            if not self._pending and not self._deleted:
+                return
+            # Start from the latest snapshot, which another process may have written.
+            self._reload()
+            snapshot = self._snapshot
+
+            replaced = self._deleted | self._pending.keys()
+            kept = np.array([row for row, id in enumerate(snapshot.ids) if id not in replaced], dtype=np.int64)
+            new_ids = list(self._pending)
+            new_vectors = np.stack([self._pending[id][0] for id in new_ids]) if new_ids else None
+
+            ids = [snapshot.ids[row] for row in kept] + new_ids
+            texts = [snapshot.texts[row] for row in kept] + [self._pending[id][1] for id in new_ids]
+            metadatas = [snapshot.metadatas[row] for row in kept] + [self._pending[id][2] for id in new_ids]
+            vectors, scales = self._merge_vectors(snapshot, kept, new_vectors)
+
+            self._write_snapshot(vectors, scales, ids, texts, metadatas)
+            self._pending.clear()
+            self._deleted.clear()
+            self._reload()
+
+    def _merge_vectors(self, snapshot: _Snapshot, kept: np.ndarray,
+                       new_vectors: Optional[np.ndarray]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        old_quantized = snapshot.scales is not None
+        parts, scale_parts = [], []
+        if len(kept):
+            old = snapshot.vectors[kept]
+            if self.quantize and old_quantized:
+                parts.append(old)
+                scale_parts.append(snapshot.scales[kept])
+            elif old_quantized:
+                parts.append(old.astype(np.float32) * snapshot.scales[kept][:, None])
+            elif self.quantize:
+                quantized, scales = _quantize(np.asarray(old, dtype=np.float32))
+                parts.append(quantized)
+                scale_parts.append(scales)
+            else:
+                parts.append(np.asarray(old, dtype=np.float32))
+        if new_vectors is not None:
+            if self.quantize:
+                quantized, scales = _quantize(new_vectors)
+                parts.append(quantized)
+                scale_parts.append(scales)
+            else:
+                parts.append(new_vectors)
+        vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.int8 if self.quantize else np.float32)
+        scales = np.concatenate(scale_parts) if self.quantize and scale_parts else (
+            np.zeros(0, dtype=np.float32) if self.quantize else None
+        )
+        return vectors, scales
+
+    def _write_snapshot(self, vectors: np.ndarray, scales: Optional[np.ndarray], ids: List[str],
+                        texts: List[str], metadatas: List[Dict[str, Any]]):
+        name = f"snapshot-{time.time_ns()}"
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "vectors.npy"), vectors)
+        if scales is not None:
+            np.save(os.path.join(directory, "scales.npy"), scales)
+        with open(os.path.join(directory, "metadata.json"), "w") as f:
+            json.dump({"quantized": scales is not None, "ids": ids, "texts": texts, "metadatas": metadatas}, f)
+
+        pointer = os.path.join(self.path, CURRENT_FILE + ".tmp")
+        with open(pointer, "w") as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(self.path, CURRENT_FILE))
+        self._prune_snapshots(keep=name)
+
+    def _prune_snapshots(self, keep: str):
+        snapshots = sorted(entry for entry in os.listdir(self.path) if entry.startswith("snapshot-"))
+        for name in snapshots[:-SNAPSHOTS_TO_KEEP]:
+            if name != keep:
+                # Processes still mapping these files keep them alive until they reload.
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def warmup(self):
+        self._reload()
+        snapshot = self._snapshot
+        if len(snapshot):
+            # Score once against every row so the first real query does not fault pages in.
+            self._scores(snapshot, np.zeros(snapshot.vectors.shape[1], dtype=np.float32), None)
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "snapshot": self._snapshot_name,
+            "vectors": len(snapshot),
+            "quantized": snapshot.scales is not None,
+            "pending_writes": len(self._pending),
+            "queries": self.queries,
+        }
+
+
+class NumpyStore(VectorStore):
+    """
+    In-process vector store with one NumpyIndex per partition, each in its own
+    sub-directory of path. Scoped queries only score the partitions they name,
+    so query cost tracks the size of the scope rather than of the whole corpus.
+    """
+
+    def __init__(self, path: str, quantize: bool = False):
+        self.path = path
+        self.quantize = quantize
+        self._partitions: Dict[str, NumpyIndex] = {}
+        self._partitions_lock = threading.Lock()
+        self._last_discovery = 0.0
+        os.makedirs(path, exist_ok=True)
+        self._discover()
+
+    @staticmethod
+    def _directory_name(partition: str) -> str:
+        return partition or DEFAULT_PARTITION_DIR
+
+    @staticmethod
+    def _partition_name(directory: str) -> str:
+        return DEFAULT_PARTITION if directory == DEFAULT_PARTITION_DIR else directory
+
+    def _discover(self):
+        """Open partitions created on disk since the last look, possibly by another process."""
+        self._last_discovery = time.monotonic()
+        for entry in os.listdir(self.path):
+            partition = self._partition_name(entry)
+            if partition not in self._partitions and os.path.exists(os.path.join(self.path, entry, CURRENT_FILE)):
+                self._partition(partition)
+
+    def _partition(self, partition: str) -> NumpyIndex:
+        index = self._partitions.get(partition)
+        if index is None:
+            with self._partitions_lock:
+                index = self._partitions.get(partition)
+                if index is None:
+                    index = NumpyIndex(os.path.join(self.path, self._directory_name(partition)), self.quantize)
+                    self._partitions[partition] = index
+        return index
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]],
+               partition: str = DEFAULT_PARTITION):
+        self._partition(partition).upsert(ids, embeddings, texts, metadatas)
+
+    def delete(self, ids: List[str], partition: str = DEFAULT_PARTITION):
+        self._partition(partition).delete(ids)
+
+    def delete_partition(self, partition: str):
+        with self._partitions_lock:
+            self._partitions.pop(partition, None)
+        shutil.rmtree(os.path.join(self.path, self._directory_name(partition)), ignore_errors=True)
+
+    def query(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+              partitions: Optional[List[str]] = None) -> List[Tuple[LangchainDocument, float]]:
+        if time.monotonic() - self._last_discovery >= RELOAD_CHECK_SECONDS:
+            self._discover()
+        names = list(self._partitions) if partitions is None else partitions
+        # A scope naming a company with nothing ingested simply contributes no results.
+        indexes = [self._partitions[name] for name in names if name in self._partitions]
+        return merge_results([index.query(embedding, top_k, filter) for index in indexes], top_k)
+
+    def flush(self):
+        for index in list(self._partitions.values()):
+            index.flush()
+
+    def warmup(self):
+        self._discover()
+        for index in list(self._partitions.values()):
+            index.warmup()
+
+    def stats(self) -> Dict[str, Any]:
+        partitions = list(self._partitions.values())
+        return {
+            "backend": "local",
+            "partitions": len(partitions),
+            "vectors": sum(len(index) for index in partitions),
+            "pending_writes": sum(index.stats()["pending_writes"] for index in partitions),
+            "queries": sum(index.queries for index in partitions),
+        }
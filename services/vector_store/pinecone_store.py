@@ -0,0 +1,104 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema.document import Document as LangchainDocument
+from pinecone import Pinecone, ServerlessSpec
+
+from services.vector_store.base import DEFAULT_PARTITION, TEXT_KEY, VectorStore
+
+# Upserts are sent in requests of at most this many vectors.
+PINECONE_UPSERT_BATCH_SIZE = 100
+# How long the list of namespaces used by unscoped queries is reused.
+NAMESPACE_CACHE_SECONDS = 60.0
+
+
+class PineconeStore(VectorStore):
+    """Pinecone index with one namespace per partition."""
+
+    def __init__(self, index_name: Optional[str] = None, pool_size: int = 20):
+        # Get index name from environment variables
+        # If using the older version that used INDEX_NAME instead of PINECONE_INDEX_NAME
+        self.index_name = index_name or os.environ.get("PINECONE_INDEX_NAME") or os.environ.get("INDEX_NAME")
+        self.pool_size = pool_size
+        self.pinecone = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"), pool_threads=pool_size)
+        self._index = None
+        self._namespaces: Optional[List[str]] = None
+        self._namespaces_fetched_at = 0.0
+
+    @property
+    def index(self):
+        # Resolving the index host is a control-plane round trip, done once.
+        if self._index is None:
+            self._index = self.pinecone.Index(
+                self.index_name,
+                pool_threads=self.pool_size,
+                connection_pool_maxsize=self.pool_size
+            )
+        return self._index
+
+    def ensure_index(self, dimension: int):
+        if self.index_name not in self.pinecone.list_indexes().names():
+            self.pinecone.create_index(
+                name=self.index_name,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-west-2")
+            )
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]],
+               partition: str = DEFAULT_PARTITION):
+        vectors = [
+            {"id": id, "values": embedding, "metadata": {**metadata, TEXT_KEY: text}}
+            for id, embedding, text, metadata in zip(ids, embeddings, texts, metadatas)
+        ]
+        self.index.upsert(vectors=vectors, namespace=partition, batch_size=PINECONE_UPSERT_BATCH_SIZE)
+
+    def delete(self, ids: List[str], partition: str = DEFAULT_PARTITION):
+        if ids:
+            self.index.delete(ids=ids, namespace=partition)
+
+    def delete_partition(self, partition: str):
+        self.index.delete(delete_all=True, namespace=partition)
+        self._namespaces = None
+
+    def _all_namespaces(self) -> List[str]:
+        now = time.monotonic()
+        if self._namespaces is None or now - self._namespaces_fetched_at > NAMESPACE_CACHE_SECONDS:
+            self._namespaces = list(self.index.describe_index_stats().namespaces.keys())
+            self._namespaces_fetched_at = now
+        return self._namespaces
+
+    @staticmethod
+    def _to_result(match) -> Tuple[LangchainDocument, float]:
+        metadata = dict(match.metadata or {})
+        text = metadata.pop(TEXT_KEY, "")
+        return LangchainDocument(page_content=text, metadata=metadata), match.score
+
+    def query(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+              partitions: Optional[List[str]] = None) -> List[Tuple[LangchainDocument, float]]:
+        namespaces = self._all_namespaces() if partitions is None else partitions
+        if not namespaces:
+            return []
+        if len(namespaces) == 1:
+            response = self.index.query(
+                vector=embedding, top_k=top_k, include_metadata=True, filter=filter, namespace=namespaces[0]
+            )
+        else:
+            # Fans out one query per namespace on the pool threads and merges by score.
+            response = self.index.query_namespaces(
+                vector=embedding, namespaces=namespaces, metric="cosine",
+                top_k=top_k, include_metadata=True, filter=filter
+            )
+        return [self._to_result(match) for match in response.matches]
+
+    def warmup(self):
+        self._all_namespaces()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "pinecone",
+            "index": self.index_name,
+            "pool_size": self.pool_size,
+            "namespaces": len(self._namespaces) if self._namespaces is not None else None,
+        }
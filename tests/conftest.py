@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules build their clients at import time; they only need a key to be present.
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,103 @@
+import asyncio
+import io
+import os
+import threading
+
+import PyPDF2
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import routes.chat as chat_routes
+import services.citation_pages as citation_pages
+from services.citation_pages import CitationPageCache
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(width=612, height=792)
+    path = tmp_path / "filing.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CitationPageCache(str(tmp_path / "pages"))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_disconnecting_leader_does_not_cancel_waiters(monkeypatch, cache, pdf_path):
+    started, proceed = threading.Event(), threading.Event()
+    extract_page = citation_pages._extract_page
+
+    def slow_extract(*args):
+        started.set()
+        proceed.wait(10)
+        extract_page(*args)
+
+    monkeypatch.setattr(citation_pages, "_extract_page", slow_extract)
+    leader = asyncio.create_task(cache.get_page(pdf_path, 1))
+    await asyncio.to_thread(started.wait, 10)
+    waiter = asyncio.create_task(cache.get_page(pdf_path, 1))
+    await asyncio.sleep(0.05)
+
+    leader.cancel()
+    await asyncio.sleep(0.05)
+    proceed.set()
+    path = await asyncio.wait_for(waiter, 10)
+
+    assert leader.cancelled()
+    assert os.path.exists(path)
+    assert (cache.misses, cache.coalesced) == (1, 1)
+    cache.release(path)
+    assert cache._pins == {}
+
+
+@pytest.mark.asyncio
+async def test_pinned_pages_are_not_evicted(cache, pdf_path):
+    first = await cache.get_page(pdf_path, 1)
+    # Room for about one page: every later miss tries to evict everything else.
+    cache.max_bytes = os.path.getsize(first)
+
+    for page_number in (2, 3):
+        cache.release(await cache.get_page(pdf_path, page_number))
+    assert os.path.exists(first)
+
+    cache.release(first)
+    cache.release(await cache.get_page(pdf_path, 4))
+    assert not os.path.exists(first)
+    assert cache._pins == {}
+
+
+@pytest.mark.asyncio
+async def test_hits_return_the_cached_path(cache, pdf_path):
+    path = await cache.get_page(pdf_path, 2)
+    cache.release(path)
+    assert await cache.get_page(pdf_path, 2) == path
+    cache.release(path)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_route_serves_the_file_and_unpins_it(monkeypatch, cache, pdf_path):
+    monkeypatch.setattr(chat_routes, "citation_page_cache", cache)
+    app = FastAPI()
+
+    @app.get("/page/{page_number}")
+    async def page(page_number: int, request: Request):
+        return await chat_routes._citation_page_response(pdf_path, page_number, request)
+
+    with TestClient(app) as client:
+        response = client.get("/page/3")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert len(PyPDF2.PdfReader(io.BytesIO(response.content)).pages) == 1
+
+        not_modified = client.get("/page/3", headers={"If-None-Match": response.headers["etag"]})
+        assert not_modified.status_code == 304
+    assert cache._pins == {}
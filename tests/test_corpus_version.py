@@ -0,0 +1,71 @@
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Select, Update
+
+from services.answer_cache import mark_companies_changed
+from utils.ingestion.document_to_db import sync_pdf_rows
+
+COMPANY_ID = str(uuid.uuid4())
+
+
+class RecordingSession:
+    """Stands in for a Session: records statements, returns stored page hashes for selects."""
+
+    def __init__(self, stored=()):
+        self.stored = list(stored)
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        rows = self.stored if isinstance(statement, Select) else []
+        return SimpleNamespace(all=lambda: list(rows))
+
+    def commit(self):
+        self.commits += 1
+
+
+def _version_bumps(db):
+    return [
+        statement for statement in db.statements
+        if isinstance(statement, Update) and statement.table.name == "company"
+        and "corpus_version" in str(statement.compile(dialect=postgresql.dialect()))
+    ]
+
+
+def _rows(content_hash="new"):
+    document_id = uuid.uuid4()
+    documents = [{"id": document_id, "company_id": COMPANY_ID, "content_hash": content_hash, "page_number": 1}]
+    chunks = [{"id": uuid.uuid4(), "document_id": document_id, "company_id": COMPANY_ID, "text": "Revenue grew"}]
+    return documents, chunks
+
+
+def test_new_chunks_mark_company_changed_in_the_same_transaction():
+    db = RecordingSession()
+    documents, chunks = _rows()
+    counts, _ = sync_pdf_rows(db, "/filings/a.pdf", COMPANY_ID, "hash", 1000, 30, documents, chunks)
+
+    assert counts["written_chunks"] == 1
+    assert len(_version_bumps(db)) == 1
+    # The caller's commit carries the bump together with the chunks.
+    assert db.commits == 0
+
+
+def test_unchanged_file_does_not_mark_company_changed():
+    documents, chunks = _rows(content_hash="same")
+    db = RecordingSession(stored=[(documents[0]["id"], "same")])
+    counts, _ = sync_pdf_rows(db, "/filings/a.pdf", COMPANY_ID, "hash", 1000, 30, documents, chunks)
+
+    assert counts["written_chunks"] == 0
+    assert _version_bumps(db) == []
+
+
+def test_mark_companies_changed_leaves_commit_to_caller():
+    db = RecordingSession()
+    mark_companies_changed(db, [COMPANY_ID, COMPANY_ID])
+    mark_companies_changed(db, [])
+
+    assert len(_version_bumps(db)) == 1
+    assert db.commits == 0
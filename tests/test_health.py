@@ -0,0 +1,37 @@
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.health import router
+from services.auth import AuthenticatedUser, get_current_user
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def test_stats_requires_authentication():
+    with TestClient(_app()) as client:
+        assert client.get("/health/stats").status_code == 401
+
+
+def test_stats_do_not_expose_filesystem_paths():
+    app = _app()
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(uuid.uuid4(), "ops@example.com", "ops")
+    with TestClient(app) as client:
+        response = client.get("/health/stats")
+    assert response.status_code == 200
+
+    def keys(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield key
+                yield from keys(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from keys(item)
+
+    assert not {"path", "directory"} & set(keys(response.json()))
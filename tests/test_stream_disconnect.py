@@ -0,0 +1,122 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from starlette.requests import ClientDisconnect
+
+import routes.chat as chat_routes
+from database.db import get_db
+from services.auth import AuthenticatedUser, get_current_user
+
+CHAT_ID = uuid.uuid4()
+USER = AuthenticatedUser(uuid.uuid4(), "analyst@example.com", "analyst")
+METADATA = [{"chunk_id": "c1", "document_id": "d1", "company_id": None, "file_path": "/filings/a.pdf", "page_number": 3}]
+
+
+@pytest.fixture
+def app(monkeypatch):
+    stored = []
+    generation_stopped = asyncio.Event()
+
+    async def add_user_message(chat_id, message, current_user, db, background_tasks):
+        return [{"role": "user", "content": message.content}], None
+
+    async def stream_response(messages, company_ids=None):
+        yield {"type": "metadata", "metadata": METADATA}
+        for token in ("Revenue ", "grew "):
+            yield {"type": "token", "content": token}
+        if messages[0]["content"] == "complete":
+            return
+        try:
+            # A slow model: the client goes away before the answer is finished.
+            for _ in range(200):
+                await asyncio.sleep(0.02)
+                yield {"type": "token", "content": "and more "}
+        finally:
+            generation_stopped.set()
+
+    async def persist_assistant_message(chat_id, user_id, content, metadata):
+        stored.append({"chat_id": chat_id, "user_id": user_id, "content": content, "metadata": metadata})
+        return SimpleNamespace(id=uuid.uuid4(), content=content, role="assistant",
+                               created_at=datetime.utcnow(), metadata_fields=metadata)
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(chat_routes, "_add_user_message", add_user_message)
+    monkeypatch.setattr(chat_routes.chat_service, "stream_response", stream_response)
+    monkeypatch.setattr(chat_routes, "_persist_assistant_message", persist_assistant_message)
+
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    app.dependency_overrides[get_db] = no_db
+    app.state.stored = stored
+    app.state.generation_stopped = generation_stopped
+    return app
+
+
+async def _stream(app, content: str, spec_version: str, disconnect_after_lines: int = None):
+    """Drive the streaming route over raw ASGI; the client disconnects after the given number of lines."""
+    body = json.dumps({"content": content, "id": str(uuid.uuid4())}).encode()
+    lines = []
+    disconnected = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if disconnected.is_set() and spec_version == "2.4":
+            raise OSError("client went away")
+        if message["type"] == "http.response.body" and message.get("body"):
+            lines.extend(message["body"].decode().splitlines())
+            if disconnect_after_lines is not None and len(lines) >= disconnect_after_lines:
+                disconnected.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": f"/chats/{CHAT_ID}/messages/stream", "raw_path": b"",
+        "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    try:
+        await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    except ClientDisconnect:
+        pass
+    return [json.loads(line) for line in lines]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+async def test_disconnect_mid_stream_saves_partial_answer(app, spec_version):
+    lines = await _stream(app, "partial", spec_version, disconnect_after_lines=3)
+    assert [line["type"] for line in lines] == ["metadata", "token", "token"]
+
+    # Generation is stopped and the partial text stored promptly, not when the
+    # abandoned response generator is eventually garbage collected.
+    await asyncio.wait_for(app.state.generation_stopped.wait(), timeout=5)
+    await asyncio.wait_for(asyncio.gather(*chat_routes._reply_tasks), timeout=5)
+    [stored] = app.state.stored
+    assert (stored["chat_id"], stored["user_id"], stored["metadata"]) == (CHAT_ID, USER.id, METADATA)
+    # Whatever was generated before the disconnect was noticed, and no more.
+    assert stored["content"].startswith("Revenue grew ")
+    assert stored["content"].count("and more ") < 50
+
+
+@pytest.mark.asyncio
+async def test_completed_stream_saves_answer_and_sends_done(app):
+    lines = await _stream(app, "complete", "2.4")
+
+    assert [line["type"] for line in lines] == ["metadata", "token", "token", "done"]
+    assert lines[-1]["message"]["content"] == "Revenue grew "
+    assert [message["content"] for message in app.state.stored] == ["Revenue grew "]
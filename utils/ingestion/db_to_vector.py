@@ -1,112 +1,165 @@
+import hashlib
+import json
+import time
 import uuid
-from sqlalchemy.orm import Session
+from typing import Dict, List, Tuple
+from sqlalchemy import or_, select, update
+from langchain.schema.document import Document as LangchainDocument
 from dotenv import load_dotenv
 import os
 
 # Import database modules
-from database.db import get_db, SessionLocal
-from database.models import Document, Chunk, Company
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.schema.document import Document as LangchainDocument
-from pinecone import Pinecone, ServerlessSpec
+from database.db import engine, SessionLocal
+from database.models import Document, Chunk
+from services.vector_store import VECTOR_STORE_BACKEND
+from services.vector_store.base import DEFAULT_PARTITION, chunk_document
+from services.answer_cache import mark_companies_changed
+from services.retrieval import get_retrieval_clients
 
 load_dotenv()
 
+# Chunks embedded and upserted per vector store call.
+VECTOR_EXPORT_BATCH_SIZE = int(os.getenv("VECTOR_EXPORT_BATCH_SIZE", "100"))
+
+
+def vector_hash(doc: LangchainDocument, backend: str, model: str) -> str:
+    """Digest of everything a chunk's stored vector depends on, including where it is stored."""
+    material = json.dumps([backend, model, doc.page_content, doc.metadata], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def prune_chunk_vectors(chunk_ids_by_company: Dict[str, List[str]], batch_size: int = VECTOR_EXPORT_BATCH_SIZE):
+    """
+    Delete the vectors of chunks removed from the database, from each company's partition,
+    and mark those companies changed so cached answers citing the chunks are dropped.
+    Call after the deleting transaction has committed.
+    """
+    chunk_ids_by_company = {company_id: ids for company_id, ids in chunk_ids_by_company.items() if ids}
+    if not chunk_ids_by_company:
+        return
+    vector_store = get_retrieval_clients().vector_store
+    for company_id, chunk_ids in chunk_ids_by_company.items():
+        for i in range(0, len(chunk_ids), batch_size):
+            vector_store.delete(chunk_ids[i:i + batch_size], partition=company_id)
+    vector_store.flush()
+    db = SessionLocal()
+    try:
+        mark_companies_changed(db, chunk_ids_by_company.keys())
+        db.commit()
+    finally:
+        db.close()
+    print(f"Removed {sum(len(ids) for ids in chunk_ids_by_company.values())} stale vectors from the vector store")
+
+
 # here also extract all documents whose path is a match.
 # then extract all chunks & contexts for those documents.
 # then send them to pinecone.
-def ingest_chunks_to_pinecone(exclude_path: str = "/path/to/exclude"):
+def ingest_chunks_to_pinecone(exclude_path: str = "/path/to/exclude", drop_unpartitioned: bool = False,
+                              batch_size: int = VECTOR_EXPORT_BATCH_SIZE, force: bool = False):
     """
-    Read all chunks from the database and store them in Pinecone.
-    Each document in Pinecone will contain context and chunk text
-    with metadata for company_id, document_id, file_path, and page_number.
+    Read all chunks from the database and store them in the configured vector store
+    (Pinecone or the local index, see VECTOR_STORE_BACKEND).
+    Each stored vector will contain context and chunk text
+    with metadata for company_id, document_id, file_path, and page_number,
+    written to a per-company partition (Pinecone namespace).
+
+    Chunks and their documents are read with one joined query on a server-side cursor
+    and embedded and upserted batch by batch as they arrive, so memory holds at most a
+    batch per company and the first vectors are written right away. A chunk whose
+    content, metadata, backend and embedding model are unchanged since it was last
+    exported (Chunk.vector_hash) is skipped, so a routine run only embeds new and
+    edited chunks.
     
     Args:
         exclude_path (str): Path pattern to exclude documents from ingestion
+        drop_unpartitioned (bool): Delete vectors from the default partition first. Use this
+            on the first run after upgrading, so vectors written before partitioning are
+            not returned twice by unscoped searches.
+        batch_size (int): Chunks per embedding and upsert call
+        force (bool): Re-export every chunk, e.g. after the vector index was emptied or
+            LOCAL_VECTOR_STORE_PATH changed
     """
-    db = SessionLocal()
+    # Embeddings model and vector store come from the shared retrieval clients,
+    # so the configured backend (Pinecone or the local index) receives the vectors.
+    clients = get_retrieval_clients()
+    embeddings_model = clients.embeddings
+    vector_store = clients.vector_store
+    
+    # Check if index exists, create if it doesn't
+    vector_store.ensure_index(dimension=1536)  # OpenAI embedding dimension
+
+    if drop_unpartitioned:
+        print("Dropping vectors written before per-company partitioning")
+        vector_store.delete_partition(DEFAULT_PARTITION)
+
+    # Chunks of documents whose path doesn't match exclude_path, with the citation fields of their page
+    chunk_rows = (
+        select(
+            Chunk.id, Chunk.text, Chunk.context,
+            Document.id, Document.company_id, Document.file_path, Document.page_number,
+            Chunk.vector_hash
+        )
+        .join(Document, Chunk.document_id == Document.id)
+        .where(or_(Document.file_path.is_(None), ~Document.file_path.like(f"%{exclude_path}%")))
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+    started_at = time.perf_counter()
+    stored = unchanged = 0
+    # Companies whose partition actually received vectors; only their cached answers go stale.
+    changed_companies = set()
+    # Rows arrive in no particular order; each company's partition fills its own batch.
+    pending: Dict[str, List[Tuple[LangchainDocument, str]]] = {}
+    writer = SessionLocal()
+
+    def store(company_id: str, batch: List[Tuple[LangchainDocument, str]]):
+        nonlocal stored
+        # Vectors are keyed by chunk id, so re-running replaces rather than duplicates them
+        texts = [doc.page_content for doc, _ in batch]
+        vector_store.upsert(
+            ids=[doc.metadata["chunk_id"] for doc, _ in batch],
+            embeddings=embeddings_model.embed_documents(texts),
+            texts=texts,
+            metadatas=[doc.metadata for doc, _ in batch],
+            partition=company_id
+        )
+        # Recorded only after the upsert succeeded, so a failed batch is retried next run.
+        writer.execute(update(Chunk), [
+            {"id": uuid.UUID(doc.metadata["chunk_id"]), "vector_hash": digest} for doc, digest in batch
+        ])
+        writer.commit()
+        stored += len(batch)
+        changed_companies.add(company_id)
+        print(f"Stored {stored} chunks in the vector store ({time.perf_counter() - started_at:.1f}s)")
+
     try:
-        # First get all document IDs that match the exclude path
-        excluded_doc_ids = [
-            doc.id for doc in db.query(Document)
-            .filter(Document.file_path.like(f"%{exclude_path}%"))
-            .all()
-        ]
-        
-        print(f"Found {len(excluded_doc_ids)} documents to exclude based on path: {exclude_path}")
-        
-        # Get all chunks except those belonging to excluded documents
-        chunks = db.query(Chunk).filter(
-            Chunk.document_id.notin_(excluded_doc_ids) if excluded_doc_ids else True
-        ).all()
-        
-        print(f"Found {len(chunks)} chunks in database after exclusion")
-
-        # Initialize OpenAI embeddings
-        embeddings_model = OpenAIEmbeddings(openai_api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        # Initialize Pinecone (ensure your Pinecone client is initialized)
-        pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-        index_name = os.environ.get('PINECONE_INDEX_NAME')
-        
-        # Check if index exists, create if it doesn't
-        if index_name not in pc.list_indexes().names():
-            pc.create_index(
-                name=index_name,
-                dimension=1536,  # OpenAI embedding dimension
-                metric='cosine',
-                spec=ServerlessSpec(cloud='aws', region='us-west-2')
-            )
-        
-        langchain_docs = []
-        
-        # Convert chunks to Langchain documents
-        for i, chunk in enumerate(chunks):
-            document = db.query(Document).filter(Document.id == chunk.document_id).first()
-            
-            if document:
-                # Create content with context and chunk text
-                content = f"Context: {chunk.context}\n\nContent: {chunk.text}"
-                
-                # Create metadata
-                metadata = {
-                    "chunk_id": str(chunk.id),
-                    "document_id": str(document.id),
-                    "company_id": str(document.company_id),
-                    "file_path": document.file_path or "",
-                    "page_number": document.page_number or 0
-                }
-                
-                # Create Langchain document
-                langchain_doc = LangchainDocument(
-                    page_content=content,
-                    metadata=metadata
-                )
-                
-                langchain_docs.append(langchain_doc)
-                
-                print(f"Preparing document {i+1}/{len(chunks)} for Pinecone")
-            else:
-                print(f"WARNING: Parent document not found for chunk {chunk.id}")
-        
-        # Store documents in batches to avoid memory issues
-        batch_size = 100
-        for i in range(0, len(langchain_docs), batch_size):
-            batch = langchain_docs[i:i+batch_size]
-            print(f"Storing batch {i//batch_size + 1}/{(len(langchain_docs) + batch_size - 1)//batch_size}")
-            
-            # Store documents in Pinecone
-            PineconeVectorStore.from_documents(
-                documents=batch,
-                embedding=embeddings_model,
-                index_name=index_name
-            )
-        
-        print(f"Successfully stored {len(langchain_docs)} documents in Pinecone")
-                
+        with engine.connect() as connection:
+            for row in connection.execute(chunk_rows):
+                # Create Langchain document with context and chunk text plus citation metadata
+                doc = chunk_document(*row[:7])
+                digest = vector_hash(doc, VECTOR_STORE_BACKEND, embeddings_model.model)
+                if not force and digest == row.vector_hash:
+                    unchanged += 1
+                    continue
+                batch = pending.setdefault(doc.metadata["company_id"], [])
+                batch.append((doc, digest))
+                if len(batch) >= batch_size:
+                    store(doc.metadata["company_id"], batch)
+                    pending[doc.metadata["company_id"]] = []
+        for company_id, batch in pending.items():
+            if batch:
+                store(company_id, batch)
+
+        vector_store.flush()
+        # Cached answers that depend on these companies are now stale
+        mark_companies_changed(writer, changed_companies)
+        writer.commit()
     finally:
-        db.close()
+        writer.close()
+    print(
+        f"Successfully stored {stored} chunks in the vector store in {time.perf_counter() - started_at:.1f}s; "
+        f"{unchanged} unchanged chunks skipped"
+    )
 
 if __name__ == "__main__":
     ingest_chunks_to_pinecone("/Users/shams/Desktop/Panache/Cursor/aha/new_backend/utils/documents/resources/Annual Report 23-24.pdf")
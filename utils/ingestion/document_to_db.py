@@ -1,137 +1,346 @@
+import hashlib
 import os
+import time
 import uuid
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
 from langchain_text_splitters import CharacterTextSplitter
 
 # Import database modules
-from database.db import get_db, SessionLocal
-from database.models import Document, Chunk, Company
+from database.db import engine, get_db, SessionLocal
+from database.models import Document, Chunk, Company, IngestedFile
+from services.answer_cache import mark_companies_changed
+from utils.ingestion.db_to_vector import prune_chunk_vectors
+from utils.ingestion.page_layout import PageLayout, extract_page_layout, highlight_boxes, locate_chunks
 
 load_dotenv()
 
+# Company that documents are filed under when the caller doesn't say.
+DEFAULT_COMPANY_ID = os.getenv("INGEST_COMPANY_ID", "0fbe6ad2-39c2-4d61-a731-9a538d907ab5")
+# Namespace for deterministic page and chunk ids; changing it re-creates every row.
+INGEST_ID_NAMESPACE = uuid.UUID("6f1c52a4-0b8e-4f57-9a51-2f0d8e3c7b19")
+# Documents per batch streamed, chunked and inserted by process_documents_to_chunks.
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 30) -> CharacterTextSplitter:
+    """Splitter shared by every page and file with the same settings."""
+    return CharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separator="\n"
+    )
+
+
+def file_digest(pdf_path: str) -> str:
+    """sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def document_id_for(company_id: str, pdf_path: str, page_number: int) -> uuid.UUID:
+    """The same page of the same file always gets the same id, so re-ingestion updates it in place."""
+    return uuid.uuid5(INGEST_ID_NAMESPACE, f"{company_id}\0{pdf_path}\0{page_number}")
+
+
+def build_pdf_rows(pdf_path: str, company_id: str = DEFAULT_COMPANY_ID, chunk_size: int = 1000,
+                   chunk_overlap: int = 30, pages: Optional[range] = None
+                   ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Parse a PDF into document rows (one per page) and chunk rows, without touching the database.
+
+    IDs are derived from content: a page's id from the file and page number, a chunk's from
+    its page and text. A chunk that survives an edit elsewhere in the file therefore keeps
+    its id, and the context and vector already computed for it.
+
+    Args:
+        pages: 0-based page indexes to parse, so a large file can be split across workers;
+            all pages by default
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Document rows and chunk rows
+    """
+    reader = PdfReader(pdf_path)
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    now = datetime.utcnow()
+    documents: List[Dict[str, Any]] = []
+    chunks: List[Dict[str, Any]] = []
+    for i in pages if pages is not None else range(len(reader.pages)):
+        # Extract text, keeping where each run of text sits on the page
+        page = extract_page_layout(reader.pages[i])
+        document_id = document_id_for(company_id, pdf_path, i + 1)
+        content_hash = hashlib.sha256(
+            f"{chunk_size}\0{chunk_overlap}\0{page.width}\0{page.height}\0{page.spans}\0{page.text}".encode("utf-8")
+        ).hexdigest()
+        documents.append({
+            "id": document_id,
+            "company_id": company_id,
+            "text": page.text,
+            "page_number": i + 1,
+            "file_path": pdf_path,
+            "page_width": page.width,
+            "page_height": page.height,
+            "content_hash": content_hash,
+            "created_at": now,
+        })
+        chunks.extend(build_chunk_rows(document_id, company_id, page.text, text_splitter, page, now))
+    return documents, chunks
+
+
+def build_chunk_rows(document_id: uuid.UUID, company_id: str, text: str, text_splitter: CharacterTextSplitter,
+                     layout: Optional[PageLayout] = None, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Chunk rows for one page's text, with ids derived from the page and chunk text.
+
+    Highlight rectangles are only known when the page layout is given.
+    """
+    now = now or datetime.utcnow()
+    text_chunks = text_splitter.split_text(text)
+    offsets = locate_chunks(text, text_chunks)
+    occurrences: Dict[str, int] = {}
+    rows = []
+    for chunk_text, offset in zip(text_chunks, offsets):
+        # Repeated text on one page (e.g. a table header) still needs distinct ids.
+        occurrence = occurrences[chunk_text] = occurrences.get(chunk_text, 0) + 1
+        rows.append({
+            "id": uuid.uuid5(document_id, f"{occurrence}\0{chunk_text}"),
+            "document_id": document_id,
+            "company_id": company_id,
+            "text": chunk_text,
+            "char_start": offset[0] if offset else None,
+            "char_end": offset[1] if offset else None,
+            "highlight_boxes": highlight_boxes(layout, *offset) if offset and layout else None,
+            "created_at": now,
+        })
+    return rows
+
+
+def is_ingested(db: Session, pdf_path: str, company_id: str, file_hash: str, chunk_size: int,
+                chunk_overlap: int) -> bool:
+    """Whether the manifest says this exact file was already stored with these settings."""
+    manifest = db.execute(select(IngestedFile).where(IngestedFile.file_path == pdf_path)).scalar_one_or_none()
+    return (
+        manifest is not None
+        and str(manifest.company_id) == str(company_id)
+        and manifest.file_hash == file_hash
+        and manifest.chunk_size == chunk_size
+        and manifest.chunk_overlap == chunk_overlap
+    )
+
+
+def sync_pdf_rows(db: Session, pdf_path: str, company_id: str, file_hash: str, chunk_size: int,
+                  chunk_overlap: int, documents: List[Dict[str, Any]], chunks: List[Dict[str, Any]]
+                  ) -> Tuple[Dict[str, int], Dict[str, List[str]]]:
+    """
+    Bring the stored pages and chunks of a file in line with freshly parsed rows, and
+    record the file in the manifest. The caller commits, so a file is updated all at
+    once or not at all.
+
+    Unchanged pages are left untouched. Changed pages are updated in place: chunks whose
+    text survived keep their row (and generated context), new ones are inserted and the
+    rest are deleted. Pages the file no longer has, and rows from earlier ingestions of
+    the same path under other ids, are deleted with their chunks.
+
+    When any chunk is written or deleted, the companies concerned are marked changed in
+    the same transaction: lexical search reads chunks straight from Postgres, so cached
+    answers may be stale before the vectors are exported. Deleted chunks still have
+    vectors; pass the returned ids to prune_chunk_vectors once the transaction has committed.
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, List[str]]]: Counts of unchanged, written and
+            removed pages and of written and removed chunks; and the ids of removed
+            chunks by company id
+    """
+    stored = dict(db.execute(
+        select(Document.id, Document.content_hash).where(Document.file_path == pdf_path)
+    ).all())
+    changed = [document for document in documents if stored.get(document["id"]) != document["content_hash"]]
+    changed_ids = {document["id"] for document in changed}
+    changed_chunks = [chunk for chunk in chunks if chunk["document_id"] in changed_ids]
+    removed_ids = set(stored) - {document["id"] for document in documents}
+
+    removed_chunk_ids: Dict[str, List[str]] = {}
+
+    def remove_chunks(*criteria):
+        removed = db.execute(
+            delete(Chunk).where(*criteria).returning(Chunk.id, Chunk.company_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for chunk_id, chunk_company_id in removed:
+            removed_chunk_ids.setdefault(str(chunk_company_id), []).append(str(chunk_id))
+
+    if changed:
+        statement = insert(Document)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[Document.id],
+            set_={column: statement.excluded[column] for column in
+                  ("company_id", "text", "page_width", "page_height", "content_hash")}
+        ), changed)
+        remove_chunks(
+            Chunk.document_id.in_(changed_ids),
+            Chunk.id.notin_([chunk["id"] for chunk in changed_chunks])
+        )
+    if changed_chunks:
+        statement = insert(Chunk)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[Chunk.id],
+            set_={column: statement.excluded[column] for column in ("char_start", "char_end", "highlight_boxes")}
+        ), changed_chunks)
+    if removed_ids:
+        remove_chunks(Chunk.document_id.in_(removed_ids))
+        db.execute(delete(Document).where(Document.id.in_(removed_ids)).execution_options(synchronize_session=False))
+    if changed_chunks or removed_chunk_ids:
+        mark_companies_changed(db, [company_id, *removed_chunk_ids])
+
+    statement = insert(IngestedFile).values(
+        file_path=pdf_path, company_id=company_id, file_hash=file_hash, chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap, page_count=len(documents), ingested_at=datetime.utcnow()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[IngestedFile.file_path],
+        set_={column: statement.excluded[column] for column in
+              ("company_id", "file_hash", "chunk_size", "chunk_overlap", "page_count", "ingested_at")}
+    ))
+    return {
+        "unchanged_pages": len(documents) - len(changed),
+        "written_pages": len(changed),
+        "removed_pages": len(removed_ids),
+        "written_chunks": len(changed_chunks),
+        "removed_chunks": sum(len(ids) for ids in removed_chunk_ids.values()),
+    }, removed_chunk_ids
+
+
 # Step 1 of ingestion.
-def extract_pdf_to_document_db(pdf_path: str, chunk_size: int = 1000, chunk_overlap: int = 30):
+def extract_pdf_to_document_db(pdf_path: str, chunk_size: int = 1000, chunk_overlap: int = 30,
+                               company_id: str = DEFAULT_COMPANY_ID):
     """
     Extract content from a PDF file and store each page as a separate document.
-    Then, create chunks from these documents and store them in the chunks database.
+    Then, create chunks from these documents and store them in the chunks database,
+    each with its character offsets and highlight rectangles on the page.
+
+    Safe to re-run: a file whose bytes haven't changed since it was last stored is
+    skipped, and otherwise only its changed pages are rewritten. All writes for the
+    file happen in one transaction.
     
     Args:
         pdf_path: Path to the PDF file
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        company_id: Company the document belongs to
     """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"PDF file not found at path: {pdf_path}")
+    # The manifest and page ids are keyed by path, so the same file must always be named alike.
+    pdf_path = os.path.abspath(pdf_path)
     
     print(f"Processing PDF: {pdf_path}")
-    
-    # Extract text from PDF
-    loader = PyPDFLoader(pdf_path)
-    pages = loader.load()
-    
-    print(f"Found {len(pages)} pages in the PDF")
-    
+    started_at = time.perf_counter()
+    file_hash = file_digest(pdf_path)
+
     # Save to document database
     db = SessionLocal()
     try:
-        # Save each page as a separate document
-        for i, page in enumerate(pages):
-            # Create document record for this page
-            document = Document(
-                id=uuid.uuid4(),
-                company_id="0fbe6ad2-39c2-4d61-a731-9a538d907ab5",
-                text=page.page_content,
-                page_number=i+1,
-                file_path=pdf_path
-            )
-            db.add(document)
-            db.commit()
-            db.refresh(document)
-            
-            print(f"Document saved for page {i+1} with ID: {document.id}")
-            
-            # Create chunks from the document
-            text_splitter = CharacterTextSplitter(
-                chunk_size=chunk_size, 
-                chunk_overlap=chunk_overlap,
-                separator="\n"
-            )
-            
-            # Split the text into chunks
-            text_chunks = text_splitter.split_text(page.page_content)
-            
-            for chunk_text in text_chunks:
-                chunk = Chunk(
-                    id=uuid.uuid4(),
-                    document_id=document.id,
-                    company_id="0fbe6ad2-39c2-4d61-a731-9a538d907ab5",
-                    text=chunk_text
-                )
-                db.add(chunk)
-            
-            db.commit()
-            print(f"Created and saved {len(text_chunks)} chunks from document {document.id} (page {i+1})")
-        
+        if is_ingested(db, pdf_path, company_id, file_hash, chunk_size, chunk_overlap):
+            print(f"Unchanged since last ingestion, skipping: {pdf_path}")
+            return
+
+        documents, chunks = build_pdf_rows(pdf_path, company_id, chunk_size, chunk_overlap)
+        parsed_at = time.perf_counter()
+        print(f"Found {len(documents)} pages in the PDF")
+
+        counts, removed_chunk_ids = sync_pdf_rows(
+            db, pdf_path, company_id, file_hash, chunk_size, chunk_overlap, documents, chunks
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
-def process_documents_to_chunks():
+    # Only after the commit: the chunks are really gone, so their vectors must go too.
+    prune_chunk_vectors(removed_chunk_ids)
+
+    print(
+        f"Synced {pdf_path}: {counts['written_pages']} pages written, {counts['unchanged_pages']} unchanged, "
+        f"{counts['removed_pages']} removed; {counts['written_chunks']} chunks written, "
+        f"{counts['removed_chunks']} removed "
+        f"(parse {parsed_at - started_at:.2f}s, write {time.perf_counter() - parsed_at:.2f}s)"
+    )
+
+def _chunk_documents(rows: List[Tuple[uuid.UUID, uuid.UUID, Optional[str]]], chunk_size: int,
+                     chunk_overlap: int) -> List[Dict[str, Any]]:
+    """Chunk a batch of (document id, company id, text) rows; runs in a worker process."""
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    chunks: List[Dict[str, Any]] = []
+    for document_id, company_id, text in rows:
+        chunks.extend(build_chunk_rows(document_id, company_id, text or "", text_splitter))
+    return chunks
+
+
+def process_documents_to_chunks(chunk_size: int = 1000, chunk_overlap: int = 30,
+                                batch_size: int = BACKFILL_BATCH_SIZE, workers: int = os.cpu_count() or 1):
     """
-    Read all documents from the database and create chunks for any that don't have chunks yet.
+    Create chunks for every document that has none yet.
+
+    Unchunked documents are found with one anti-join and streamed from a server-side
+    cursor in batches. Worker processes chunk the batches, and the chunks are bulk
+    inserted and committed one batch at a time, so memory stays flat and an interrupted
+    run resumes where it stopped.
     """
-    db = SessionLocal()
-    try:
-        # Get all documents
-        documents = db.query(Document).all()
-        print(f"Found {len(documents)} documents in database")
-        
-        # For each document, check if it has chunks
-        for document in documents:
-            existing_chunks = db.query(Chunk).filter(Chunk.document_id == document.id).count()
-            
-            if existing_chunks == 0:
-                print(f"Creating chunks for document {document.id}")
-                
-                # Check if document has page_number and file_path attributes
-                if not hasattr(document, 'page_number') or document.page_number is None:
-                    print(f"Document {document.id} missing page_number, setting default")
-                    document.page_number = 0
-                    
-                if not hasattr(document, 'file_path') or document.file_path is None:
-                    print(f"Document {document.id} missing file_path, setting default")
-                    document.file_path = "unknown_path"
-                    
-                db.commit()
-                
-                # Create chunks for this document
-                text_splitter = CharacterTextSplitter(
-                    chunk_size=1000, 
-                    chunk_overlap=30,
-                    separator="\n"
-                )
-                
-                # Split the text into chunks
-                text_chunks = text_splitter.split_text(document.text)
-                
-                for chunk_text in text_chunks:
-                    chunk = Chunk(
-                        id=uuid.uuid4(),
-                        document_id=document.id,
-                        company_id=document.company_id,
-                        text=chunk_text
-                    )
-                    db.add(chunk)
-                
-                db.commit()
-                print(f"Created {len(text_chunks)} chunks for document {document.id}")
-            else:
-                print(f"Document {document.id} already has {existing_chunks} chunks, skipping")
-                
-    finally:
-        db.close()
+    # Legacy rows without a page number or path get the same placeholders as before, in one statement each.
+    with SessionLocal() as db:
+        db.execute(update(Document).where(Document.page_number.is_(None)).values(page_number=0))
+        db.execute(update(Document).where(Document.file_path.is_(None)).values(file_path="unknown_path"))
+        db.commit()
+
+    unchunked = (
+        select(Document.id, Document.company_id, Document.text)
+        .where(~exists().where(Chunk.document_id == Document.id))
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    insert_chunks = insert(Chunk).on_conflict_do_nothing(index_elements=[Chunk.id])
+    started_at = time.perf_counter()
+    documents = chunks = 0
+
+    # Reads stream on their own connection, since committing would close the server-side cursor.
+    with engine.connect() as reader, SessionLocal() as writer, ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def write_oldest():
+            nonlocal chunks
+            rows = pending.popleft().result()
+            if rows:
+                writer.execute(insert_chunks, rows)
+                # Lexical search sees the new chunks as soon as this commits.
+                mark_companies_changed(writer, {row["company_id"] for row in rows})
+            writer.commit()
+            chunks += len(rows)
+
+        for partition in reader.execute(unchunked).partitions():
+            pending.append(executor.submit(_chunk_documents, [tuple(row) for row in partition],
+                                           chunk_size, chunk_overlap))
+            documents += len(partition)
+            # Keep a couple of batches per worker in flight; more would only grow memory.
+            if len(pending) >= 2 * workers:
+                write_oldest()
+                print(f"Chunked {documents} documents into {chunks} chunks ({time.perf_counter() - started_at:.1f}s)")
+        while pending:
+            write_oldest()
+
+    print(f"Created {chunks} chunks for {documents} documents in {time.perf_counter() - started_at:.1f}s")
 
 
  # Example usage
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Ingest every PDF under one or more directories or glob patterns for a company.
+
+    python utils/ingestion/ingest_directory.py utils/documents/yatharth --ticker YATHARTH
+
+PDFs are parsed on a process pool, a large file split into page ranges across workers.
+Parsed rows stream back to this process, which alone writes to the database: one
+transaction per file, committed as soon as all of the file's pages have arrived.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Tuple
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from pypdf import PdfReader
+
+from database.db import SessionLocal
+from database.models import Company
+from utils.ingestion.db_to_vector import prune_chunk_vectors
+from utils.ingestion.document_to_db import build_pdf_rows, file_digest, is_ingested, sync_pdf_rows
+
+# Pages parsed per task; smaller spreads one large PDF over more workers.
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+# Parse tasks queued ahead of the writer; bounds memory held in parsed but unwritten rows.
+INGEST_MAX_PENDING_TASKS_PER_WORKER = 4
+
+
+def find_pdfs(patterns: List[str]) -> List[str]:
+    """PDF paths under the given directories or matching the given glob patterns, without duplicates."""
+    paths: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*.pdf"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.extend(match for match in sorted(matches) if match.lower().endswith(".pdf"))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def _parse_pages(pdf_path: str, first_page: int, last_page: int, company_id: str,
+                 chunk_size: int, chunk_overlap: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], float]:
+    started_at = time.perf_counter()
+    documents, chunks = build_pdf_rows(pdf_path, company_id, chunk_size, chunk_overlap,
+                                       pages=range(first_page, last_page))
+    return documents, chunks, time.perf_counter() - started_at
+
+
+class _FileProgress:
+    """Rows of one PDF collected from its page-range tasks until the file is complete."""
+
+    def __init__(self, path: str, file_hash: str, tasks: int):
+        self.path = path
+        self.file_hash = file_hash
+        self.remaining = tasks
+        self.documents: List[Dict[str, Any]] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self.parse_seconds = 0.0
+        self.started_at = time.perf_counter()
+        self.failed = False
+
+
+def ingest_directory(patterns: List[str], ticker: str, workers: int = os.cpu_count() or 1,
+                     pages_per_task: int = INGEST_PAGES_PER_TASK, chunk_size: int = 1000,
+                     chunk_overlap: int = 30) -> Dict[str, int]:
+    """
+    Parse and store all PDFs matched by patterns under the company with the given ticker.
+
+    Returns:
+        Dict[str, int]: Counts of files, failed files, pages and chunks
+
+    Raises:
+        ValueError: If no company has the ticker
+    """
+    db = SessionLocal()
+    try:
+        company = db.query(Company).filter(Company.ticker == ticker).first()
+        if company is None:
+            raise ValueError(f"No company with ticker {ticker}")
+        company_id = str(company.id)
+
+        pdf_paths = find_pdfs(patterns)
+        print(f"Found {len(pdf_paths)} PDFs for {ticker}")
+
+        # Page ranges of every file; a file's ranges run concurrently on different workers.
+        tasks = []
+        files: Dict[str, _FileProgress] = {}
+        totals = {"files": 0, "unchanged": 0, "failed": 0, "pages": 0, "chunks": 0}
+        for pdf_path in pdf_paths:
+            try:
+                file_hash = file_digest(pdf_path)
+                if is_ingested(db, pdf_path, company_id, file_hash, chunk_size, chunk_overlap):
+                    totals["unchanged"] += 1
+                    continue
+                page_count = len(PdfReader(pdf_path).pages)
+            except Exception as e:
+                print(f"Skipping unreadable PDF {pdf_path}: {e}")
+                totals["failed"] += 1
+                continue
+            if page_count == 0:
+                # No ranges means no task would ever complete the file; report it now.
+                print(f"Skipping PDF without pages {pdf_path}")
+                totals["failed"] += 1
+                continue
+            ranges = [(first, min(first + pages_per_task, page_count))
+                      for first in range(0, page_count, pages_per_task)]
+            files[pdf_path] = _FileProgress(pdf_path, file_hash, len(ranges))
+            tasks.extend((pdf_path, first, last) for first, last in ranges)
+
+        # The manifest lookups ran in a transaction; don't hold it open while parsing.
+        db.rollback()
+        print(f"Ingesting {len(files)} new or changed PDFs with {workers} workers; {totals['unchanged']} unchanged")
+
+        started_at = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            completed = 0
+            queued = iter(tasks)
+            max_pending = workers * INGEST_MAX_PENDING_TASKS_PER_WORKER
+
+            def submit_more():
+                for pdf_path, first, last in queued:
+                    future = executor.submit(_parse_pages, pdf_path, first, last, company_id,
+                                             chunk_size, chunk_overlap)
+                    pending[future] = pdf_path
+                    if len(pending) >= max_pending:
+                        return
+
+            submit_more()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress = files[pending.pop(future)]
+                    progress.remaining -= 1
+                    try:
+                        documents, chunks, parse_seconds = future.result()
+                        progress.documents.extend(documents)
+                        progress.chunks.extend(chunks)
+                        progress.parse_seconds += parse_seconds
+                    except Exception as e:
+                        print(f"Failed to parse {progress.path}: {e}")
+                        progress.failed = True
+                    if progress.remaining == 0:
+                        completed += 1
+                        _write_file(db, progress, totals, f"[{completed}/{len(files)}]", company_id,
+                                    chunk_size, chunk_overlap)
+                submit_more()
+
+        print(
+            f"Ingested {totals['files']} files ({totals['pages']} pages, {totals['chunks']} chunks) "
+            f"in {time.perf_counter() - started_at:.2f}s; {totals['unchanged']} unchanged, {totals['failed']} failed"
+        )
+        return totals
+    finally:
+        db.close()
+
+
+def _write_file(db, progress: _FileProgress, totals: Dict[str, int], label: str, company_id: str,
+                chunk_size: int, chunk_overlap: int):
+    """Sync a fully parsed file in one transaction and report its timing."""
+    if progress.failed:
+        totals["failed"] += 1
+        print(f"{label} Skipped {progress.path}: a page range failed to parse")
+        return
+    progress.documents.sort(key=lambda document: document["page_number"])
+    write_started_at = time.perf_counter()
+    try:
+        counts, removed_chunk_ids = sync_pdf_rows(
+            db, progress.path, company_id, progress.file_hash, chunk_size, chunk_overlap,
+            progress.documents, progress.chunks
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        totals["failed"] += 1
+        print(f"{label} Failed to write {progress.path}: {e}")
+        return
+    try:
+        prune_chunk_vectors(removed_chunk_ids)
+    except Exception as e:
+        # The rows are already committed; don't abort the remaining files over it.
+        print(f"{label} Failed to remove stale vectors for {progress.path}: {e}")
+    totals["files"] += 1
+    totals["pages"] += counts["written_pages"]
+    totals["chunks"] += counts["written_chunks"]
+    print(
+        f"{label} {os.path.basename(progress.path)}: {counts['written_pages']} pages written, "
+        f"{counts['unchanged_pages']} unchanged, {counts['removed_pages']} removed; "
+        f"{counts['written_chunks']} chunks written, {counts['removed_chunks']} removed (parse {progress.parse_seconds:.2f}s summed over workers, "
+        f"write {time.perf_counter() - write_started_at:.2f}s, "
+        f"elapsed {time.perf_counter() - progress.started_at:.2f}s)"
+    )
+    # Free the rows now that they are stored.
+    progress.documents, progress.chunks = [], []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse and store PDFs for a company in parallel.")
+    parser.add_argument("paths", nargs="+", help="Directories (searched recursively) or glob patterns")
+    parser.add_argument("--ticker", required=True, help="Ticker of the company the filings belong to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=INGEST_PAGES_PER_TASK)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=30)
+    args = parser.parse_args()
+    totals = ingest_directory(args.paths, args.ticker, args.workers, args.pages_per_task,
+                              args.chunk_size, args.chunk_overlap)
+    sys.exit(1 if totals["failed"] else 0)
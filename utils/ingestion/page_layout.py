@@ -0,0 +1,114 @@
+import math
+import re
+from typing import List, Optional, Tuple
+
+from pypdf import PageObject
+
+# Average glyph advance as a fraction of the font size. The text visitor reports where
+# each run of text starts but not its width, so widths are estimated from its length.
+AVERAGE_CHAR_WIDTH_EM = 0.5
+# Rectangles whose baselines are closer than this fraction of their height are merged.
+SAME_LINE_TOLERANCE = 0.3
+
+# (start, end, x0, y0, x1, y1): a run of page text and its box, in PDF points from the
+# bottom-left corner of the page.
+TextSpan = Tuple[int, int, float, float, float, float]
+
+
+class PageLayout:
+    """A page's extracted text with the position of every run of text on the page."""
+
+    def __init__(self, text: str, spans: List[TextSpan], width: float, height: float):
+        self.text = text
+        self.spans = spans
+        self.width = width
+        self.height = height
+
+
+def _multiply(m: List[float], n: List[float]) -> List[float]:
+    """Product of two PDF transformation matrices [a, b, c, d, e, f]."""
+    return [
+        m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def extract_page_layout(page: PageObject) -> PageLayout:
+    """
+    Extract a page's text together with a bounding box for each run of text.
+
+    The text is exactly what page.extract_text() returns, so character offsets into it
+    can be mapped back to positions on the page.
+    """
+    pieces: List[str] = []
+    spans: List[TextSpan] = []
+    length = 0
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        nonlocal length
+        start = length
+        pieces.append(text)
+        length += len(text)
+        if not text.strip():
+            return
+        matrix = _multiply(tm, cm)
+        x, y = matrix[4], matrix[5]
+        scale_x = math.hypot(matrix[0], matrix[1]) * font_size
+        scale_y = math.hypot(matrix[2], matrix[3]) * font_size
+        # Text ending in a newline belongs to a single line; count only visible characters.
+        width = len(text.rstrip()) * AVERAGE_CHAR_WIDTH_EM * scale_x
+        spans.append((start, start + len(text), x, y - 0.2 * scale_y, x + width, y + 0.8 * scale_y))
+
+    text = page.extract_text(visitor_text=visitor)
+    joined = "".join(pieces)
+    if joined != text:
+        # The visitor did not see the final text verbatim; offsets would be wrong.
+        spans = []
+    box = page.cropbox
+    return PageLayout(text, spans, float(box.width), float(box.height))
+
+
+def locate_chunks(page_text: str, chunks: List[str]) -> List[Optional[Tuple[int, int]]]:
+    """
+    Character offsets of each chunk within the page text, in order.
+
+    The splitter collapses repeated separators and strips whitespace, so a chunk that is
+    not a verbatim substring is matched token by token across any whitespace.
+    """
+    offsets: List[Optional[Tuple[int, int]]] = []
+    cursor = 0
+    for chunk in chunks:
+        start = page_text.find(chunk, cursor)
+        if start >= 0:
+            end = start + len(chunk)
+        else:
+            tokens = chunk.split()
+            match = re.compile(r"\s+".join(re.escape(token) for token in tokens)).search(page_text, cursor) if tokens else None
+            if match is None:
+                offsets.append(None)
+                continue
+            start, end = match.span()
+        offsets.append((start, end))
+        # Chunks overlap, so the next one may start before this one ends.
+        cursor = start + 1
+    return offsets
+
+
+def highlight_boxes(layout: PageLayout, start: int, end: int) -> List[List[float]]:
+    """
+    Rectangles covering page text between two character offsets, one per line,
+    as [x0, y0, x1, y1] in PDF points from the bottom-left of the page.
+    """
+    boxes: List[List[float]] = []
+    for span_start, span_end, x0, y0, x1, y1 in layout.spans:
+        if span_end <= start or span_start >= end:
+            continue
+        if boxes:
+            last = boxes[-1]
+            tolerance = SAME_LINE_TOLERANCE * (last[3] - last[1])
+            if abs(last[1] - y0) <= tolerance and abs(last[3] - y1) <= tolerance:
+                last[0], last[2] = min(last[0], x0), max(last[2], x1)
+                continue
+        boxes.append([x0, y0, x1, y1])
+    return [[round(value, 1) for value in box] for box in boxes]
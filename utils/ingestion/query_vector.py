@@ -1,9 +1,11 @@
 import os
+import sys
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.schema.document import Document as LangchainDocument
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.retrieval import get_retrieval_clients
 
 load_dotenv()
 
@@ -20,32 +22,28 @@ def query_vector_store(query_text, top_k=5):
     Returns:
         list: List of documents most relevant to the query
     """
-    # Initialize OpenAI embeddings
-    embeddings_model = OpenAIEmbeddings(openai_api_key=os.environ.get("OPENAI_API_KEY"))
-    
-    # Initialize Pinecone client
-    pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-    
-    # Get index name from environment variables
-    index_name = os.environ.get('PINECONE_INDEX_NAME')
-    
-    # If using the older version that used INDEX_NAME instead of PINECONE_INDEX_NAME
-    if not index_name:
-        index_name = os.environ.get('INDEX_NAME')
-    
-    # Create vector store
-    vector_store = PineconeVectorStore(
-        index_name=index_name,
-        embedding=embeddings_model
-    )
-    
-    # Search for similar documents
-    results = vector_store.similarity_search(
-        query=query_text,
-        k=top_k
-    )
+    clients = get_retrieval_clients()
+    embedding = clients.embed_query(query_text)
+    return clients.search_by_vector(embedding, top_k=top_k)
+
+async def aquery_vector_store(query_text, top_k=5, embedding=None):
+    """
+    Non-blocking variant of query_vector_store for use inside request handlers.
+    The query is embedded through the async OpenAI client; the vector search
+    is synchronous, so it runs on a worker thread.
     
-    return results
+    Args:
+        query_text (str): The question or query text to search for
+        top_k (int): Number of results to return
+        embedding (list): Precomputed embedding of query_text, if the caller has one
+        
+    Returns:
+        list: List of documents most relevant to the query
+    """
+    clients = get_retrieval_clients()
+    if embedding is None:
+        embedding = await clients.aembed_query(query_text)
+    return await clients.asearch_by_vector(embedding, top_k=top_k)
 
 def format_results(results):
     """
@@ -1,58 +1,158 @@
 #!/usr/bin/env python
+import argparse
+import csv
 import json
 import os
 import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+
 from database.db import SessionLocal
 from database.models import Company
 
-def insert_companies():
+# Rows per INSERT ... ON CONFLICT statement.
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "1000"))
+READ_BUFFER_SIZE = 64 * 1024
+
+
+def _stream_json_array(path: str) -> Iterator[dict]:
+    """Yield the objects of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_BUFFER_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                more = f.read(READ_BUFFER_SIZE)
+                if not more:
+                    raise
+                buffer += more
+                continue
+            yield item
+            buffer = buffer[end:]
+
+
+def _stream_json_lines(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _stream_csv(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_companies(path: str) -> Iterator[Dict[str, str]]:
+    """
+    Stream {"ticker", "name"} records from a .json array, .jsonl or .csv file.
+
+    Raises:
+        ValueError: If a record has no ticker
+    """
+    if path.endswith(".csv"):
+        records = _stream_csv(path)
+    elif path.endswith(".jsonl"):
+        records = _stream_json_lines(path)
+    else:
+        records = _stream_json_array(path)
+    for line, record in enumerate(records, start=1):
+        ticker = (record.get("ticker") or "").strip()
+        if not ticker:
+            raise ValueError(f"Record {line} of {path} has no ticker: {record}")
+        yield {"ticker": ticker, "name": (record.get("name") or "").strip()}
+
+
+def _batches(records: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    batch: Dict[str, Dict[str, str]] = {}
+    for record in records:
+        # One statement may not touch the same row twice; the last record for a ticker wins.
+        batch[record["ticker"]] = record
+        if len(batch) >= size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+def upsert_companies(db, records: Iterable[Dict[str, str]], batch_size: int = UPSERT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Insert new companies and update changed names, one statement per batch.
+
+    Rows whose name is unchanged are left alone, so re-running a load writes nothing.
+    The caller commits.
+
+    Returns:
+        Dict[str, int]: inserted, updated and unchanged counts
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for batch in _batches(records, batch_size):
+        now = datetime.utcnow()
+        statement = insert(Company).values([
+            {"id": uuid.uuid4(), "ticker": record["ticker"], "name": record["name"], "created_at": now}
+            for record in batch
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Company.ticker],
+            set_={"name": statement.excluded.name},
+            where=Company.name.is_distinct_from(statement.excluded.name)
+        ).returning(
+            # xmax is zero only for rows this statement inserted rather than updated.
+            literal_column("xmax = 0").label("inserted")
+        )
+        written = db.execute(statement).scalars().all()
+        inserted = sum(1 for was_inserted in written if was_inserted)
+        counts["inserted"] += inserted
+        counts["updated"] += len(written) - inserted
+        counts["unchanged"] += len(batch) - len(written)
+    return counts
+
+
+def insert_companies(path: str = os.path.join(os.path.dirname(__file__), 'companies.json'),
+                     batch_size: int = UPSERT_BATCH_SIZE):
     # Open database session
     db = SessionLocal()
-    
+    started_at = time.perf_counter()
+
     try:
-        # Read companies from JSON file
-        with open(os.path.join(os.path.dirname(__file__), 'companies.json'), 'r') as f:
-            companies_data = json.load(f)
-        
-        # Count for reporting
-        inserted_count = 0
-        skipped_count = 0
-        
-        # Process each company
-        for company_data in companies_data:
-            # Check if company already exists (by ticker)
-            existing_company = db.query(Company).filter(Company.ticker == company_data['ticker']).first()
-            
-            if existing_company:
-                print(f"Company with ticker {company_data['ticker']} already exists. Skipping.")
-                skipped_count += 1
-                continue
-            
-            # Create new company
-            new_company = Company(
-                ticker=company_data['ticker'],
-                name=company_data['name']
-            )
-            
-            # Add to session
-            db.add(new_company)
-            inserted_count += 1
-        
-        # Commit all changes
+        # One transaction: a failed load leaves the table as it was.
+        counts = upsert_companies(db, read_companies(path), batch_size)
         db.commit()
-        print(f"Companies import completed: {inserted_count} inserted, {skipped_count} skipped.")
-    
+        print(
+            f"Companies import completed in {time.perf_counter() - started_at:.2f}s: "
+            f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged."
+        )
+        # Running API processes pick up the change on their next company index refresh.
+        return counts
+
     except Exception as e:
         db.rollback()
         print(f"Error inserting companies: {str(e)}")
-    
+
     finally:
         # Close the session
         db.close()
 
+
 if __name__ == "__main__":
-    insert_companies()
+    parser = argparse.ArgumentParser(description="Upsert companies from a JSON, JSON Lines or CSV file.")
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(__file__), 'companies.json'))
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    args = parser.parse_args()
+    insert_companies(args.path, args.batch_size)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Load test for the chat turn pipeline against stubbed slow external services.
+
+Drives the real POST /chats route of the app, in process, with an increasing number
+of in-flight requests on a single event loop. Authentication, the database session,
+chat and message writes, Postgres full-text search, the embedding cache, the
+embedding call and the vector search thread offload all run as in production. Only
+the external services are stubbed: the OpenAI embeddings and chat models answer
+after a fixed delay, and the vector store's query blocks its calling thread for a
+fixed delay, as Pinecone's synchronous client does. No API keys or network are
+needed, but DATABASE_URL must point at a Postgres with the schema created.
+
+If the turn path is non-blocking, throughput grows roughly linearly with the number
+of in-flight requests until the connection pool saturates; a blocking call anywhere
+on the path pins it at about 1 / latency.
+
+Usage:
+    python utils/load_test.py --llm-latency 0.5 --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ChatOpenAI refuses to construct without a key; the stubs never use it.
+os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+
+import httpx
+import numpy as np
+from langchain_core.messages import AIMessage
+from langchain.schema.document import Document as LangchainDocument
+from sqlalchemy import delete, select
+
+import services.retrieval as retrieval_module
+from database.db import AsyncSessionLocal, pool_stats
+from database.models import Chat, Message, User
+from services.auth import create_access_token, token_claims
+from services.retrieval import get_retrieval_clients
+from services.vector_store.base import DEFAULT_PARTITION, VectorStore
+
+LOAD_TEST_EMAIL = "load-test@example.invalid"
+EMBEDDING_DIMENSION = 1536
+
+
+class SlowFakeLLM:
+    """Stands in for ChatOpenAI and answers after a fixed delay."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="stubbed answer")
+
+
+class SlowFakeEmbeddings:
+    """Stands in for OpenAIEmbeddings: a deterministic vector per text after a fixed delay."""
+
+    model = "load-test-embedding"
+
+    def __init__(self, latency: float, **kwargs):
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSION)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+class SlowFakeVectorStore(VectorStore):
+    """Vector store whose query blocks the calling thread for a fixed delay."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]],
+               partition: str = DEFAULT_PARTITION):
+        pass
+
+    def delete(self, ids: List[str], partition: str = DEFAULT_PARTITION):
+        pass
+
+    def delete_partition(self, partition: str):
+        pass
+
+    def query(self, embedding: List[float], top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+              partitions: Optional[List[str]] = None) -> List[Tuple[LangchainDocument, float]]:
+        time.sleep(self.latency)
+        return [
+            (LangchainDocument(
+                page_content="Context: stub\n\nContent: stub",
+                metadata={"chunk_id": f"stub-{rank}", "page_number": 1}
+            ), 1.0 - rank / 100)
+            for rank in range(top_k)
+        ]
+
+
+def stub_external_clients(embedding_latency: float, search_latency: float):
+    """Have the retrieval clients build the slow fakes instead of OpenAI and Pinecone clients."""
+    retrieval_module.OpenAIEmbeddings = lambda **kwargs: SlowFakeEmbeddings(embedding_latency, **kwargs)
+    retrieval_module.build_vector_store = lambda pool_size=20: SlowFakeVectorStore(search_latency)
+
+
+async def load_test_token() -> Tuple[uuid.UUID, str]:
+    """Create the load test user if needed and return their id and an access token."""
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.email == LOAD_TEST_EMAIL))).scalars().first()
+        if user is None:
+            user = User(email=LOAD_TEST_EMAIL, username="load-test", hashed_password="!")
+            db.add(user)
+            await db.commit()
+        return user.id, create_access_token(token_claims(user))
+
+
+async def remove_load_test_chats(user_id: uuid.UUID):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Message).where(Message.user_id == user_id))
+        await db.execute(delete(Chat).where(Chat.user_id == user_id))
+        await db.commit()
+
+
+async def run_level(client: httpx.AsyncClient, token: str, concurrency: int, requests_per_level: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one_turn(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/chats",
+                json={
+                    "id": str(uuid.uuid4()),
+                    "message": {"id": str(uuid.uuid4()), "content": f"What is their ARPOB? ({i})"},
+                },
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+                if errors == 1:
+                    print(f"First failed request: {response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_turn(i) for i in range(requests_per_level)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return requests_per_level / elapsed, p50, p95, errors
+
+
+async def main(llm_latency: float, embedding_latency: float, search_latency: float, levels,
+               requests_per_level: int, keep_data: bool):
+    stub_external_clients(embedding_latency, search_latency)
+    # Imported after stubbing so no real client is ever built.
+    import main as app_module
+    import routes.chat as chat_routes
+
+    chat_routes.chat_service.llm = SlowFakeLLM(llm_latency)
+    chat_routes.chat_service.title_llm = SlowFakeLLM(llm_latency)
+    # Every turn must reach the stubbed LLM rather than a cached answer.
+    chat_routes.chat_service.answer_cache = None
+
+    # The answer and the title run side by side, so a turn costs one LLM latency.
+    ideal_turn = embedding_latency + search_latency + llm_latency
+    print(
+        f"Stubbed turn latency: {ideal_turn:.3f}s (embedding {embedding_latency}s + "
+        f"vector search {search_latency}s + llm {llm_latency}s), plus the database"
+    )
+
+    async with app_module.lifespan(app_module.app):
+        user_id, token = await load_test_token()
+        transport = httpx.ASGITransport(app=app_module.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+                print(f"{'in-flight':>10} {'req/s':>10} {'ideal req/s':>12} {'p50 (s)':>10} {'p95 (s)':>10} {'errors':>8}")
+                for concurrency in levels:
+                    total = max(requests_per_level, concurrency * 2)
+                    throughput, p50, p95, errors = await run_level(client, token, concurrency, total)
+                    print(f"{concurrency:>10} {throughput:>10.1f} {concurrency / ideal_turn:>12.1f} "
+                          f"{p50:>10.3f} {p95:>10.3f} {errors:>8}")
+
+            retrieval = get_retrieval_clients().stats()
+            db_pool = pool_stats()
+            print(
+                f"Peak in flight: embeddings {retrieval['embeddings']['peak_in_flight']}, "
+                f"vector search {retrieval['vector_search']['peak_in_flight']}, "
+                f"lexical search {retrieval['lexical_search']['peak_in_flight']}; "
+                f"DB pool max wait {db_pool['max_wait_ms']}ms, {db_pool['timeouts']} checkout timeouts"
+            )
+        finally:
+            if not keep_data:
+                await remove_load_test_chats(user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent chat turn load test against stubbed slow external services")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stubbed LLM takes per call")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds the stubbed embedding call takes")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds the stubbed vector search blocks its thread")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64], help="In-flight request levels to test")
+    parser.add_argument("--requests", type=int, default=64, help="Minimum number of requests per level")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the chats the load test created")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.llm_latency, args.embedding_latency, args.search_latency, args.concurrency,
+                     args.requests, args.keep_data))